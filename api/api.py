@@ -2,172 +2,212 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.authtoken.models import Token
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 
 from .serializers import *
+from .catalog import GameListing, get_error_response, get_game_fields
+from .cache import cache_anonymous_response
+from .tasks import task_runner, save_card, save_address
 
 from users import models as user_models
+from users import hashers
 from shopping import models as shopping_models
+from shopping.suggestions import suggestion_index
+from shopping.cart import get_cart_totals, update_cart, CartError
+from shopping.checkout import place_order, CheckoutError, IdempotencyKeyReused
 
+import hashlib
 import time
 class UserView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        serializer = UserSerializer(user, context={'request': request})
-        
-        cart_items = shopping_models.CartItem.objects.filter(user=user)
-        cart_subtotal = sum(item.game.price * item.quantity for item in cart_items)
+        # ?include=cart_items,addresses loads only those sections, ?include= (empty) is just the
+        # identity plus the cart count and subtotal, no include loads everything
+        include = None
+        if 'include' in request.query_params:
+            include = [name.strip() for name in request.query_params.get('include').split(',') if name.strip()]
+            unknown = set(include) - set(UserSerializer.SECTIONS)
+            if unknown:
+                return Response({
+                    'success': False,
+                    'message': f'Unknown section(s): {", ".join(sorted(unknown))}'
+                }, status=400)
+
+        autofill = request.query_params.get('autofill', '').lower() == 'true'
+        serializer = UserSerializer(user, include=include, context={'request': request, 'autofill': autofill})
+        cart_totals = get_cart_totals(user)
         
         return Response({
             'success': True,
             'data': {
                 **serializer.data,
-                'cart_subtotal': cart_subtotal
+                'cart_count': cart_totals['item_count'],
+                'cart_subtotal': cart_totals['subtotal']
             }
         })
 
 class AllGameInfo(APIView):
     permission_classes = [AllowAny]
 
+    @cache_anonymous_response
     def get(self, request):
-        filters = request.query_params
-        games = shopping_models.Game.objects.all()
+        try:
+            listing = GameListing(request.query_params, request.user)
+            games = list(listing.games)
+            total = listing.count.count() if listing.count is not None else listing.total
+        except Exception as e:
+            return Response(*get_error_response(e))
+        return Response(*listing.get_response(games, total))
+    
+class SpecificGameInfo(APIView):
+    permission_classes = [AllowAny]
 
-        if not filters:
-            page = int(request.query_params.get('page', 1))
-            page_size = int(request.query_params.get('page_size', 50))
-          
-            offset = (page - 1) * page_size
-            
-            total_games = games.count()
-            
-            games_paginated = games[offset:offset + page_size]
-            
-            total_pages = (total_games + page_size - 1) // page_size
-            has_next = page < total_pages
-            has_previous = page > 1
-            
-            serializer = GameSerializer(games_paginated, many=True)
-            return Response({
-                'success': True,
-                'data': {
-                    "games": serializer.data,
-                    "pagination": {
-                        'current_page': page,
-                        'page_size': page_size,
-                        'total_games': total_games,
-                        'total_pages': total_pages,
-                        'has_next': has_next,
-                        'has_previous': has_previous,
-                    }
-                }
-            })
+    @cache_anonymous_response
+    def post(self, request):
+        game_id = request.data.get('game_id')
         
+        if not game_id:
+            return Response({
+                'success': False,
+                'message': 'Game ID is required.'
+            }, status=400)
+
         try:
-            if 'platform' in filters:
-                platform = filters.get('platform')
-                games = games.filter(platforms__name=platform)
-            if 'genre' in filters:
-                genre = filters.get('genre')
-                games = games.filter(genres__name=genre)
-            if 'is_sale' in filters:
-                is_sale = filters.get('is_sale').lower() == 'true'
-                if is_sale:
-                    games = games.filter(is_sale=is_sale)
-            if 'hide_owned' in filters:
-                hide_owned = filters.get('hide_owned').lower() == 'true'
-                if hide_owned and request.user.is_authenticated:
-                    user = request.user
-                    owned_games = shopping_models.OwnedGame.objects.filter(user=user).values_list('game_id', flat=True)
-                    games = games.exclude(id__in=owned_games)
-            if 'sort_by' in filters:
-                sort_by = filters.get('sort_by')
-                if sort_by == 'price_asc':
-                    games = games.order_by('price')
-                elif sort_by == 'price_desc':
-                    games = games.order_by('-price')
-                elif sort_by == 'release_date':
-                    games = games.order_by('-release_date')
-                elif sort_by == 'title':
-                    games = games.order_by('title')
-            if 'search' in filters:
-                search_query = filters.get('search')
-                games = games.filter(title__icontains=search_query)
-
-            page = int(filters.get('page', 1))
-            page_size = int(filters.get('page_size', 50))
-            
-            offset = (page - 1) * page_size
-            
-            total_games = games.count()
-            
-            games = games[offset:offset + page_size]
-            
-            total_pages = (total_games + page_size - 1) // page_size
-            has_next = page < total_pages
-            has_previous = page > 1
-        except Exception as e:
+            fields = get_game_fields(request.query_params)
+        except ValueError as e:
             return Response({
                 'success': False,
-                'message': f'Error processing filters: {str(e)}'
+                'message': str(e)
             }, status=400)
-        
-        if not games.exists():
+
+        try:
+            game = shopping_models.Game.objects.with_catalog_data(fields).get(id=game_id)
+        except shopping_models.Game.DoesNotExist:
             return Response({
                 'success': False,
-                'message': 'No games found with the provided filters.'
+                'message': 'Game not found.'
             }, status=404)
+
+        serializer = GameSerializer(game, fields=fields)
         
-        serializer = GameSerializer(games, many=True)
+        return Response({
+            'success': True,
+            'data': serializer.data
+        })
+
+class BulkGameInfo(APIView):
+    permission_classes = [AllowAny]
+
+    # hydrates a whole cart or order history in one request instead of one SpecificGameInfo call per game
+    @cache_anonymous_response
+    def post(self, request):
+        serializer = BulkGameRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': serializer.errors
+            }, status=400)
+
+        try:
+            fields = get_game_fields(request.query_params)
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=400)
+
+        # keep the caller's order but only look each id up once
+        game_ids = list(dict.fromkeys(serializer.validated_data['game_ids']))
+        games = {game.id: game for game in shopping_models.Game.objects.with_catalog_data(fields).filter(id__in=game_ids)}
+
+        game_serializer = GameSerializer(
+            [games[game_id] for game_id in game_ids if game_id in games],
+            many=True,
+            fields=fields
+        )
         return Response({
             'success': True,
             'data': {
-                'games': serializer.data,
-                'pagination': {
-                    'current_page': page if 'page' in filters else 1,
-                    'page_size': page_size if 'page_size' in filters else len(serializer.data),
-                    'total_games': total_games if 'page' in filters else len(serializer.data),
-                    'total_pages': total_pages if 'page' in filters else 1,
-                    'has_next': has_next if 'page' in filters else False,
-                    'has_previous': has_previous if 'page' in filters else False,
-                }
+                'games': game_serializer.data,
+                'not_found': [game_id for game_id in game_ids if game_id not in games],
             }
         })
-    
-class SpecificGameInfo(APIView):
+
+def get_game_updated_at(request, game_id):
+    # one cheap lookup shared by the etag and last-modified checks
+    if not hasattr(request, '_game_updated_at'):
+        request._game_updated_at = shopping_models.Game.objects.filter(id=game_id).values_list('updated_at', flat=True).first()
+    return request._game_updated_at
+
+def game_detail_etag(request, game_id):
+    updated_at = get_game_updated_at(request, game_id)
+    if updated_at is None:
+        return None
+    etag = f'{game_id}-{int(updated_at.timestamp() * 1000000)}'
+    # each sparse fieldset is its own representation, so it gets its own etag
+    try:
+        fields = get_game_fields(request.query_params)
+    except ValueError:
+        return None
+    if fields is not None:
+        etag += '-' + hashlib.sha1(','.join(fields).encode()).hexdigest()[:8]
+    return f'"{etag}"'
+
+def game_detail_last_modified(request, game_id):
+    return get_game_updated_at(request, game_id)
+
+class GameDetail(APIView):
     permission_classes = [AllowAny]
 
-    def post(self, request):
-        game_id = request.data.get('game_id')
-        
-        if not game_id:
+    # answers If-None-Match / If-Modified-Since with a 304 before the game is even loaded
+    @method_decorator(condition(etag_func=game_detail_etag, last_modified_func=game_detail_last_modified))
+    def get(self, request, game_id):
+        try:
+            fields = get_game_fields(request.query_params)
+        except ValueError as e:
             return Response({
                 'success': False,
-                'message': 'Game ID is required.'
+                'message': str(e)
             }, status=400)
 
         try:
-            game = shopping_models.Game.objects.get(id=game_id)
+            game = shopping_models.Game.objects.with_catalog_data(fields).get(id=game_id)
         except shopping_models.Game.DoesNotExist:
             return Response({
                 'success': False,
                 'message': 'Game not found.'
             }, status=404)
 
-        serializer = GameSerializer(game)
-        
-        return Response({
+        serializer = GameSerializer(game, fields=fields)
+        response = Response({
             'success': True,
             'data': serializer.data
         })
+        patch_cache_control(response, public=True, max_age=settings.GAME_DETAIL_CACHE_MAX_AGE)
+        return response
 
 class EditGameCart(APIView):
     permission_classes = [IsAuthenticated]
 
+    # both methods read the cart once as {id, game_id} rows and hand back that list with the change
+    # applied, instead of loading a game per item and re-reading the cart afterwards
+
+    def get_game_id(self, request):
+        try:
+            return int(request.data.get('game_id'))
+        except (TypeError, ValueError):
+            return None
+
     def post(self, request):
         user = request.user
-        game_id = request.data.get('game_id')
+        game_id = self.get_game_id(request)
         
         if not game_id:
             return Response({
@@ -175,41 +215,51 @@ class EditGameCart(APIView):
                 'message': 'Game ID is required.'
             }, status=400)
 
-        try:
-            game = shopping_models.Game.objects.get(id=game_id)
-        except shopping_models.Game.DoesNotExist:
+        cart = list(shopping_models.CartItem.objects.filter(user=user).summaries())
+
+        # whether the game exists and whether it's owned, in one query
+        is_owned = shopping_models.Game.objects.filter(id=game_id).annotate(
+            is_owned=Exists(shopping_models.OwnedGame.objects.filter(user=user, game=OuterRef('pk')))
+        ).values_list('is_owned', flat=True).first()
+
+        if is_owned is None:
             return Response({
                 'success': False,
                 'message': 'Game not found.'
             }, status=404)
         
-        owned_games = shopping_models.OwnedGame.objects.filter(user=user, game=game)
-        if owned_games.exists():
+        if is_owned:
             return Response({
                 'success': False,
                 'message': 'Game is already owned.'
             }, status=400)
 
-        if shopping_models.CartItem.objects.filter(user=user, game=game).exists():
+        if any(item['game_id'] == game_id for item in cart):
             return Response({
                 'success': False,
                 'message': 'Game is already in the cart.'
             }, status=400)
 
-        shopping_models.CartItem.objects.create(user=user, game=game)
-
-        cart_items = shopping_models.CartItem.objects.filter(user=user)
-        cart_serializer = BasicUserCartItemSerializer(cart_items, many=True)
+        try:
+            with transaction.atomic():
+                cart_item = shopping_models.CartItem.objects.create(user=user, game_id=game_id)
+        except IntegrityError:
+            # added by a concurrent request since the cart was read
+            return Response({
+                'success': False,
+                'message': 'Game is already in the cart.'
+            }, status=400)
+        cart.append({'id': cart_item.id, 'game_id': cart_item.game_id})
         
         return Response({
             'success': True,
-            'data': cart_serializer.data,
+            'data': cart,
             'message': 'Game added to cart successfully.'
         })
     
     def delete(self, request):
         user = request.user
-        game_id = request.data.get('game_id')
+        game_id = self.get_game_id(request)
         
         if not game_id:
             return Response({
@@ -217,31 +267,62 @@ class EditGameCart(APIView):
                 'message': 'Game ID is required.'
             }, status=400)
 
-        try:
-            cart_item = shopping_models.CartItem.objects.get(user=user, game__id=game_id)
-            cart_item.delete()
-        except shopping_models.CartItem.DoesNotExist:
+        cart = list(shopping_models.CartItem.objects.filter(user=user).summaries())
+        item = next((item for item in cart if item['game_id'] == game_id), None)
+        if item is None:
             return Response({
                 'success': False,
                 'message': 'Game not found in cart.'
             }, status=404)
 
-        cart_items = shopping_models.CartItem.objects.filter(user=user)
-        cart_serializer = BasicUserCartItemSerializer(cart_items, many=True)
+        # deleting through an instance keeps the cart signals firing without fetching the row again
+        shopping_models.CartItem(user=user, **item).delete()
+        cart.remove(item)
         
         return Response({
             'success': True,
-            'data': cart_serializer.data,
+            'data': cart,
             'message': 'Game removed from cart successfully.'
         })
     
+class BatchEditCart(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # {"add": [game ids], "remove": [game ids]}, all or nothing
+        serializer = CartBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': serializer.errors
+            }, status=400)
+
+        user = request.user
+        try:
+            update_cart(user, serializer.validated_data['add'], serializer.validated_data['remove'])
+        except CartError as e:
+            return Response({
+                'success': False,
+                'message': str(e)
+            }, status=400)
+
+        cart_totals = get_cart_totals(user)
+        return Response({
+            'success': True,
+            'data': {
+                'cart_items': list(shopping_models.CartItem.objects.filter(user=user).summaries()),
+                'cart_subtotal': cart_totals['subtotal']
+            },
+            'message': 'Cart updated successfully.'
+        })
+
 class ViewCart(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        cart_items = shopping_models.CartItem.objects.filter(user=user)
-        cart_subtotal = sum(item.game.price * item.quantity for item in cart_items)
+        cart_items = shopping_models.CartItem.objects.filter(user=user).with_game()
+        cart_totals = get_cart_totals(user)
 
         serializer = CartDetailItemSerializer(cart_items, many=True)
         
@@ -249,7 +330,7 @@ class ViewCart(APIView):
             'success': True,
             'data': {
                 'cart_items': serializer.data,
-                'cart_subtotal': cart_subtotal
+                'cart_subtotal': cart_totals['subtotal']
             }
         })
     
@@ -258,7 +339,7 @@ class OwnedGamesView(APIView):
 
     def get(self, request):
         user = request.user
-        owned_games = shopping_models.OwnedGame.objects.filter(user=user)
+        owned_games = shopping_models.OwnedGame.objects.filter(user=user).with_game()
         
         serializer = OwnedGameSerializer(owned_games, many=True)
         
@@ -278,13 +359,8 @@ class SearchSuggestions(APIView):
                 'message': 'Query parameter is required.'
             }, status=400)
 
-        games = shopping_models.Game.objects.filter(title__icontains=query)[:10]
-        suggestions = []
-        for game in games:
-            suggestions.append({
-                'id': game.id,
-                'title': game.title
-            })
+        # answered from the per-worker title index, this endpoint doesn't touch the database
+        suggestions = suggestion_index.suggest(query, limit=10)
 
         return Response({
             'success': True,
@@ -303,100 +379,65 @@ class CreateOrder(APIView):
                 'message': order_serializer.errors
             }, status=400)
 
+        validated_data = order_serializer.validated_data
+        form_data = validated_data['form_data']
+        game_ids = validated_data['game_ids']
+        # a retried submit with the same key gets the original order back instead of a second one
+        idempotency_key = request.headers.get('Idempotency-Key') or validated_data.get('idempotency_key')
+        if idempotency_key and len(idempotency_key) > 64:
+            return Response({
+                'success': False,
+                'message': {'idempotency_key': ['Ensure this field has no more than 64 characters.']}
+            }, status=400)
+
         try:
-            validated_data = order_serializer.validated_data
-            form_data = validated_data['form_data']
-            game_ids = validated_data['game_ids']
-            
-            card_details = form_data.get('cardDetails', {})
-            cvv = card_details.get('cvv', '')
-            
-            # save card if requested, the CVV is processed but not stored
-            if form_data.get('saveCard', False):
-                try:
-                    card_data = {
-                        'nameOnCard': card_details.get('nameOnCard'),
-                        'cardNumber': card_details.get('cardNumber'),
-                        'expiryDate': card_details.get('expiryDate'),
-                        'cvv': cvv
-                    }
-                    card_serializer = CreditCardCreateSerializer(
-                        data=card_data, 
-                        context={'request': request}
-                    )
-                    if card_serializer.is_valid():
-                        card_serializer.save()
-                except Exception as e:
-                    print(f"Card save error: {e}")
-            
-            # save address if requested
-            if form_data.get('saveAddress', False):
-                try:
-                    address_data = form_data.get('address', {})
-                    address_serializer = AddressCreateSerializer(
-                        data=address_data, 
-                        context={'request': request}
-                    )
-                    if address_serializer.is_valid():
-                        address_serializer.save()
-                except Exception as e:
-                    print(f"Address save error: {e}")
-            
-            games = shopping_models.Game.objects.filter(id__in=game_ids)
-            total_amount = order_serializer.calculate_total_amount(games)
-            
-            order = shopping_models.Order.objects.create(
-                user=request.user,
-                total_amount=total_amount,
-                is_completed=True
-            )
-            
-            order_items = []
-            owned_game_objects = []
-            
-            for game in games:
-                purchase_price = game.sale_price if game.is_sale and game.sale_price else game.price
-                
-                order_items.append(
-                    shopping_models.OrderItem(
-                        order=order,
-                        game=game,
-                        purchase_price=purchase_price,
-                        quantity=1
-                    )
-                )
-                
-                owned_game_objects.append(
-                    shopping_models.OwnedGame(user=request.user, game=game)
-                )
-            
-            shopping_models.OrderItem.objects.bulk_create(order_items)
-            shopping_models.OwnedGame.objects.bulk_create(owned_game_objects)
-            
-            shopping_models.CartItem.objects.filter(
-                user=request.user, 
-                game__in=games
-            ).delete()
-            
-            order_response_serializer = OrderSerializer(order)
+            order, created = place_order(request.user, game_ids, idempotency_key=idempotency_key)
+        except IdempotencyKeyReused as e:
             return Response({
-                'success': True,
-                'data': order_response_serializer.data,
-                'message': 'Order created successfully!'
-            })
-            
+                'success': False,
+                'message': {'idempotency_key': [str(e)]}
+            }, status=422)
+        except CheckoutError as e:
+            return Response({
+                'success': False,
+                'message': {'game_ids': [str(e)]}
+            }, status=400)
         except Exception as e:
             return Response({
                 'success': False,
                 'message': f'Error creating order: {str(e)}'
             }, status=500)
+
+        if created:
+            # saving the card/address (encryption, hashing, duplicate checks) happens in the background
+            # once the order is committed, failures there are logged and don't affect the order
+            if form_data.get('saveCard', False):
+                card_details = form_data.get('cardDetails', {})
+                card_data = {
+                    'nameOnCard': card_details.get('nameOnCard'),
+                    'cardNumber': card_details.get('cardNumber'),
+                    'expiryDate': card_details.get('expiryDate'),
+                    'cvv': card_details.get('cvv', '')
+                }
+                task_runner.submit_on_commit(save_card, request.user.pk, card_data)
+
+            if form_data.get('saveAddress', False):
+                task_runner.submit_on_commit(save_address, request.user.pk, form_data.get('address', {}))
+
+        order = shopping_models.Order.objects.with_items().get(pk=order.pk)
+        order_response_serializer = OrderSerializer(order)
+        return Response({
+            'success': True,
+            'data': order_response_serializer.data,
+            'message': 'Order created successfully!' if created else 'Order already created.'
+        })
         
 class OrderInfoView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         user = request.user
-        orders = shopping_models.Order.objects.filter(user=user).order_by('-order_date')
+        orders = shopping_models.Order.objects.filter(user=user).with_items().order_by('-order_date')
         
         if not orders.exists():
             return Response({
@@ -421,7 +462,7 @@ class OrderInfoView(APIView):
             }, status=400)
 
         try:
-            order = shopping_models.Order.objects.get(id=order_id, user=request.user)
+            order = shopping_models.Order.objects.with_items().get(id=order_id, user=request.user)
         except shopping_models.Order.DoesNotExist:
             return Response({
                 'success': False,
@@ -435,6 +476,63 @@ class OrderInfoView(APIView):
             'data': serializer.data
         })
 
+class OrderHistoryView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    # paginated order history, orders/items/games load in a fixed number of queries whatever the page size
+    # ?compact=true swaps the live games for the title/image captured at checkout (three queries in total)
+    def get(self, request):
+        try:
+            page = int(request.query_params.get('page', 1))
+            page_size = min(int(request.query_params.get('page_size', 20)), 100)
+            if page < 1 or page_size < 1:
+                raise ValueError('page and page_size must be at least 1.')
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'message': f'Error processing pagination: {str(e)}'
+            }, status=400)
+
+        compact = request.query_params.get('compact', '').lower() == 'true'
+        orders = shopping_models.Order.objects.filter(user=request.user).order_by('-order_date', '-id')
+        total_orders = orders.count()
+
+        offset = (page - 1) * page_size
+        if compact:
+            orders = orders.with_item_snapshots()
+            serializer = CompactOrderSerializer(orders[offset:offset + page_size], many=True)
+        else:
+            orders = orders.with_items()
+            serializer = OrderSerializer(orders[offset:offset + page_size], many=True)
+
+        total_pages = (total_orders + page_size - 1) // page_size
+        return Response({
+            'success': True,
+            'data': {
+                'orders': serializer.data,
+                'pagination': {
+                    'current_page': page,
+                    'page_size': page_size,
+                    'total_orders': total_orders,
+                    'total_pages': total_pages,
+                    'has_next': page < total_pages,
+                    'has_previous': page > 1,
+                }
+            }
+        })
+
+class UserLogout(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # deleting the token also drops it from the token cache (users.signals)
+        if isinstance(request.auth, Token):
+            Token.objects.filter(key=request.auth.key).delete()
+        return Response({
+            'success': True,
+            'message': 'Logged out successfully.'
+        })
+
 class UserSignUp(APIView):
     permission_classes = [AllowAny]
 
@@ -447,33 +545,30 @@ class UserSignUp(APIView):
                     'message': serializer.errors
                 }, status=400)
             
-            first_name = serializer.validated_data.get('first_name', '')
-            last_name = serializer.validated_data.get('last_name', '')
             username = serializer.validated_data.get('username')
-            email = serializer.validated_data.get('email')
-            password = serializer.validated_data.get('password')
-
-            if user_models.User.objects.filter(username=username).exists():
-                return Response({
-                    'success': False,
-                    'message': 'Username already exists.'
-                }, status=400)
-            if user_models.User.objects.filter(email=email).exists():
+            user = user_models.User(
+                username=user_models.User.normalize_username(username),
+                email=user_models.User.objects.normalize_email(serializer.validated_data.get('email')),
+                first_name=serializer.validated_data.get('first_name', ''),
+                last_name=serializer.validated_data.get('last_name', ''),
+            )
+            # the slow hash runs before the transaction (in a bounded hashing slot, see users.hashers)
+            hashers.set_password(user, serializer.validated_data.get('password'))
+
+            # the user and their token are created together, a duplicate username or email is
+            # caught by the unique constraints instead of checked for up front
+            try:
+                with transaction.atomic():
+                    user.save()
+                    token = Token.objects.create(user=user)
+            except IntegrityError:
+                # the constraints ignore case, so the clash can be a different spelling
+                field = 'username' if user_models.User.objects.filter(username__iexact=user.username).exists() else 'email'
                 return Response({
                     'success': False,
-                    'message': 'Email already exists.'
+                    'message': CreateUserSerializer.unique_error(field)
                 }, status=400)
-            
-            user = user_models.User.objects.create_user(
-                username=username,
-                email=email,
-                password=password,
-                first_name=first_name,
-                last_name=last_name
-            )
-            user.save()
 
-            token, created = Token.objects.get_or_create(user=user)
             return Response({
                 'success': True,
                 'data': {
@@ -482,6 +577,8 @@ class UserSignUp(APIView):
                 'message': 'User created successfully!'
             })
         
+        except hashers.HashingBusy:
+            raise
         except Exception as e:
             return Response({
                 'success': False,
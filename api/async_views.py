@@ -0,0 +1,110 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_safe, require_POST
+from rest_framework.exceptions import ParseError
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from shopping import models as shopping_models
+from shopping.suggestions import suggestion_index
+
+from .api import AllGameInfo, SpecificGameInfo, SearchSuggestions
+from .cache import acache_anonymous_response, render_json
+from .catalog import GameListing, get_error_response, get_game_fields
+from .serializers import GameSerializer
+
+# async versions of the read-only catalog endpoints, routed instead of the DRF views when
+# ASYNC_CATALOG_VIEWS is on (for ASGI deployments). they give the same responses as the sync views.
+# anonymous requests stay on the event loop: the queries go through the async ORM (aiterator, acount, aget)
+# and serializing the preloaded games doesn't touch the database. only the helpers that run their own
+# queries (facet index rebuilds, the search index) are handed to a thread. requests with credentials are
+# passed to the DRF view, which does the authentication and never shares cached responses
+
+sync_all_games = sync_to_async(AllGameInfo.as_view())
+sync_specific_game = sync_to_async(SpecificGameInfo.as_view())
+sync_search_suggestions = sync_to_async(SearchSuggestions.as_view())
+
+def has_credentials(request):
+    return 'HTTP_AUTHORIZATION' in request.META or settings.SESSION_COOKIE_NAME in request.COOKIES
+
+def as_api_request(request):
+    # query_params and the parsed body, without running any authentication (the caller is anonymous)
+    return Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES])
+
+async def load(games):
+    return [game async for game in games.aiterator()]
+
+def error(message, status):
+    return render_json({
+        'success': False,
+        'message': message
+    }, status=status)
+
+@csrf_exempt
+@require_safe
+async def all_games(request):
+    if has_credentials(request):
+        return await sync_all_games(request)
+    return await _all_games(as_api_request(request))
+
+@acache_anonymous_response
+async def _all_games(request):
+    try:
+        # the filters and facet counts may query (or rebuild) the indexes, so they run in a thread
+        listing = await sync_to_async(GameListing)(request.query_params, request.user)
+        games = await load(listing.games)
+        total = await listing.count.acount() if listing.count is not None else listing.total
+    except Exception as e:
+        return render_json(*get_error_response(e))
+    return render_json(*listing.get_response(games, total))
+
+@csrf_exempt
+@require_POST
+async def specific_game(request):
+    if has_credentials(request):
+        return await sync_specific_game(request)
+    request = as_api_request(request)
+    try:
+        request.data
+    except ParseError as e:
+        return error(str(e), 400)
+    return await _specific_game(request)
+
+@acache_anonymous_response
+async def _specific_game(request):
+    game_id = request.data.get('game_id')
+
+    if not game_id:
+        return error('Game ID is required.', 400)
+
+    try:
+        fields = get_game_fields(request.query_params)
+    except ValueError as e:
+        return error(str(e), 400)
+
+    try:
+        game = await shopping_models.Game.objects.with_catalog_data(fields).aget(id=game_id)
+    except shopping_models.Game.DoesNotExist:
+        return error('Game not found.', 404)
+
+    return render_json({
+        'success': True,
+        'data': GameSerializer(game, fields=fields).data
+    })
+
+@csrf_exempt
+@require_safe
+async def search_suggestions(request):
+    if has_credentials(request):
+        return await sync_search_suggestions(request)
+
+    query = request.GET.get('query', '')
+    if not query:
+        return error('Query parameter is required.', 400)
+
+    # the title index is in memory, the database is only read when it has to be (re)built
+    return render_json({
+        'success': True,
+        'data': await suggestion_index.asuggest(query, limit=10)
+    })
@@ -0,0 +1,102 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework.response import Response
+
+from .renderers import FastJSONRenderer
+from shopping.versioning import get_catalog_cache, get_catalog_version, aget_catalog_version
+
+# response cache for the AllowAny catalog endpoints. anonymous callers get the same bytes for the same
+# parameters, so the rendered data is cached under the current catalog version and served with an ETag.
+# the backend is whatever CACHES['catalog'] points at (locmem LRU, file based, redis...)
+
+# the headers that make a request authenticated (token or session), so shared caches keep those apart
+VARY_HEADERS = ('Authorization', 'Cookie')
+
+def build_cache_key(request, kwargs, version=None):
+    # the query string (and json body for the POST endpoints) in a stable order
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    body = request.data if request.method == 'POST' and isinstance(request.data, dict) else {}
+    normalized = json.dumps([request.path, params, kwargs, body], sort_keys=True, default=str)
+    digest = hashlib.sha256(normalized.encode()).hexdigest()
+    if version is None:
+        version = get_catalog_version()
+    return f'catalog:response:{version}:{digest}'
+
+def make_etag(content):
+    return f'"{hashlib.sha1(content).hexdigest()}"'
+
+def etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+def cache_anonymous_response(view_method):
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            # hide_owned and friends depend on the user, never share those
+            response = view_method(self, request, *args, **kwargs)
+            patch_vary_headers(response, VARY_HEADERS)
+            return response
+
+        cache = get_catalog_cache()
+        key = build_cache_key(request, kwargs)
+        cached = cache.get(key)
+        if cached is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            # store plain json data, the serializer's ReturnList/ReturnDict don't pickle cleanly
+            content = FastJSONRenderer().render(response.data)
+            etag = make_etag(content)
+            cached = (json.loads(content), etag)
+            cache.set(key, cached)
+
+        data, etag = cached
+        # a conditional POST can't be answered with a 304, only GETs get one
+        if request.method in ('GET', 'HEAD') and etag_matches(request, etag):
+            response = Response(status=304)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        patch_vary_headers(response, VARY_HEADERS)
+        return response
+
+    return wrapper
+
+def render_json(data, status=200):
+    # the same bytes the renderer gives the sync views
+    return HttpResponse(FastJSONRenderer().render(data), status=status, content_type='application/json')
+
+def acache_anonymous_response(view):
+    # cache_anonymous_response for the async views (api.async_views), which only see anonymous
+    # requests. entries are shared with the sync views
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        cache = get_catalog_cache()
+        key = build_cache_key(request, kwargs, await aget_catalog_version())
+        cached = await cache.aget(key)
+        if cached is None:
+            response = await view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = (json.loads(response.content), make_etag(response.content))
+            await cache.aset(key, cached)
+
+        data, etag = cached
+        if request.method in ('GET', 'HEAD') and etag_matches(request, etag):
+            response = HttpResponse(status=304)
+        else:
+            response = render_json(data)
+        response['ETag'] = etag
+        patch_vary_headers(response, VARY_HEADERS)
+        return response
+
+    return wrapper
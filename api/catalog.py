@@ -0,0 +1,219 @@
+import json
+
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from shopping import models as shopping_models
+from shopping import search
+from shopping.facets import facet_index
+
+from .pagination import CURSOR_SORT_KEYS, get_cursor_sort, get_cursor_queryset, get_cursor_page
+from .serializers import GameSerializer
+
+# sort_by query values and the ordering they map to
+SORT_OPTIONS = {
+    'price_asc': 'price',
+    'price_desc': '-price',
+    'release_date': '-release_date',
+    'title': 'title',
+}
+
+# query params that shape the response rather than pick which games are in it
+RESPONSE_PARAMS = ('fields', 'exclude', 'facets')
+
+def get_game_fields(params):
+    # sparse fieldsets: ?fields=title,price keeps just those, ?exclude=description drops those
+    # returns None for the full payload, id is always included
+    if 'fields' in params:
+        requested = [name.strip() for name in params.get('fields').split(',') if name.strip()]
+        keep = lambda name: name in requested
+    elif 'exclude' in params:
+        requested = [name.strip() for name in params.get('exclude').split(',') if name.strip()]
+        keep = lambda name: name not in requested
+    else:
+        return None
+
+    unknown = set(requested) - set(GameSerializer.Meta.fields)
+    if unknown:
+        raise ValueError(f'Unknown game field(s): {", ".join(sorted(unknown))}')
+    return tuple(name for name in GameSerializer.Meta.fields if name == 'id' or keep(name))
+
+def has_filters(params):
+    return any(key not in RESPONSE_PARAMS for key in params)
+
+def get_facet_filters(filters):
+    return {
+        'platform': filters.get('platform'),
+        'genre': filters.get('genre'),
+        'on_sale': filters.get('is_sale', '').lower() == 'true',
+    }
+
+def filter_ids(games, game_ids):
+    # games whose id is in game_ids, passed as a single query parameter however many there are
+    # (a json array on sqlite, an array on postgres), other backends get a plain IN
+    if connection.vendor == 'sqlite':
+        return games.filter(id__in=RawSQL('SELECT value FROM json_each(%s)', [json.dumps(sorted(game_ids))]))
+    if connection.vendor == 'postgresql':
+        game_id = f'"{games.model._meta.db_table}"."id"'
+        return games.filter(RawSQL(f'{game_id} = ANY(%s)', [sorted(game_ids)], output_field=BooleanField()))
+    return games.filter(id__in=game_ids)
+
+def filter_games(games, filters, user):
+    # applies the platform/genre/sale/ownership/search filters from the query string
+    # returns the queryset plus its size when the facet index alone decided it (so no COUNT is needed), else None
+    total = None
+    game_ids = facet_index.match(**get_facet_filters(filters))
+    if game_ids is not None:
+        # the rows and the total both come from the same index snapshot
+        games = filter_ids(games, game_ids)
+        total = len(game_ids)
+    if 'hide_owned' in filters:
+        if filters.get('hide_owned').lower() == 'true' and user.is_authenticated:
+            owned_games = shopping_models.OwnedGame.objects.filter(user=user).values_list('game_id', flat=True)
+            games = games.exclude(id__in=owned_games)
+            total = None
+    if 'search' in filters:
+        # best match first unless sort_by says otherwise
+        games = search.search_games(games, filters.get('search'))
+        total = None
+    return games, total
+
+def wants_facets(filters):
+    return filters.get('facets', '').lower() == 'true'
+
+def get_facet_counts(filters):
+    # per-platform/genre/sale counts within the current platform/genre/sale selection, straight from the index
+    return facet_index.counts(facet_index.match(**get_facet_filters(filters)))
+
+def sort_games(games, sort_by):
+    # unknown sort values keep the default ordering, same as before
+    if sort_by in SORT_OPTIONS:
+        return games.order_by(SORT_OPTIONS[sort_by])
+    return games
+
+class CatalogError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def get_error_response(error):
+    # (body, status) for a failed catalog page. a CatalogError says what went wrong, anything
+    # else came out of applying the filters
+    if isinstance(error, CatalogError):
+        return {'success': False, 'message': str(error)}, error.status
+    return {'success': False, 'message': f'Error processing filters: {str(error)}'}, 400
+
+class GameListing:
+    # one page of the game catalog (AllGameInfo and api.async_views.all_games). building it does the
+    # synchronous work: parsing the params, the filters and the facet counts. the view then loads
+    # `games` and, when it isn't None, counts `count` its own way (list()/count() or aiterator()/acount()),
+    # and get_response() turns those into the (body, status) of the response
+    def __init__(self, filters, user):
+        self.filters = filters
+        try:
+            self.fields = get_game_fields(filters)
+        except ValueError as e:
+            raise CatalogError(str(e))
+
+        # known up front when the facet index decided the filters, else counted from `count`
+        self.total = None
+        self.count = None
+        # cursor mode is opt-in, passing ?cursor= (empty for the first page) switches to it
+        if 'cursor' in filters:
+            self.sort_by = get_cursor_sort(filters.get('sort_by'))
+            self.games = self.get_cursor_games(user)
+        else:
+            self.sort_by = None
+            self.games = self.get_page_games(user)
+        self.facets = get_facet_counts(filters) if wants_facets(filters) else None
+
+    def get_page_games(self, user):
+        games = shopping_models.Game.objects.with_catalog_data(self.fields)
+        if has_filters(self.filters):
+            games, self.total = filter_games(games, self.filters, user)
+            if 'sort_by' in self.filters:
+                games = sort_games(games, self.filters.get('sort_by'))
+        if self.total is None:
+            self.count = games
+
+        self.page = int(self.filters.get('page', 1))
+        self.page_size = int(self.filters.get('page_size', 50))
+        offset = (self.page - 1) * self.page_size
+        return games[offset:offset + self.page_size]
+
+    def get_cursor_games(self, user):
+        # the cursor is built from the sort key, so it has to be loaded even if the response leaves it out
+        query_fields = self.fields
+        sort_field = CURSOR_SORT_KEYS[self.sort_by][0]
+        if self.fields is not None and sort_field not in self.fields:
+            query_fields = self.fields + (sort_field,)
+        games = shopping_models.Game.objects.with_catalog_data(query_fields)
+
+        self.page_size = int(self.filters.get('page_size', 50))
+        if self.page_size < 1:
+            raise ValueError('page_size must be at least 1.')
+
+        games, known_total = filter_games(games, self.filters, user)
+        # the total costs a full COUNT, so only run it when the client asks for it (or the facet index knows it)
+        if self.filters.get('include_total', '').lower() == 'true':
+            self.total = known_total
+            if known_total is None:
+                self.count = games
+        return get_cursor_queryset(games, self.sort_by, self.filters.get('cursor'), self.page_size)
+
+    def get_response(self, games, total):
+        # games: the loaded `games` rows, total: the counted `count` (or self.total)
+        if self.sort_by is not None:
+            games, pagination = self.get_cursor_pagination(games, total)
+        elif has_filters(self.filters):
+            pagination = self.get_filtered_pagination(games, total)
+        else:
+            pagination = self.get_pagination(total)
+
+        if not games and not self.filters.get('cursor') and has_filters(self.filters):
+            return {'success': False, 'message': 'No games found with the provided filters.'}, 404
+
+        data = {
+            'games': GameSerializer(games, many=True, fields=self.fields).data,
+            'pagination': pagination,
+        }
+        if self.facets is not None:
+            data['facets'] = self.facets
+        return {'success': True, 'data': data}, 200
+
+    def get_pagination(self, total):
+        total_pages = (total + self.page_size - 1) // self.page_size
+        return {
+            'current_page': self.page,
+            'page_size': self.page_size,
+            'total_games': total,
+            'total_pages': total_pages,
+            'has_next': self.page < total_pages,
+            'has_previous': self.page > 1,
+        }
+
+    def get_filtered_pagination(self, games, total):
+        # without ?page the filtered response describes just the games it returned
+        if 'page' not in self.filters:
+            return {
+                'current_page': 1,
+                'page_size': self.page_size if 'page_size' in self.filters else len(games),
+                'total_games': len(games),
+                'total_pages': 1,
+                'has_next': False,
+                'has_previous': False,
+            }
+        return self.get_pagination(total)
+
+    def get_cursor_pagination(self, rows, total):
+        games, next_cursor = get_cursor_page(rows, self.sort_by, self.page_size)
+        pagination = {
+            'page_size': self.page_size,
+            'sort_by': self.sort_by,
+            'next_cursor': next_cursor,
+            'has_next': next_cursor is not None,
+        }
+        if total is not None:
+            pagination['total_games'] = total
+        return games, pagination
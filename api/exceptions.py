@@ -0,0 +1,15 @@
+from rest_framework.response import Response
+from rest_framework.views import exception_handler as drf_exception_handler
+
+from users.hashers import HashingBusy
+
+def exception_handler(exc, context):
+    # DRF's handler, plus a 503 for logins and signups that couldn't get a hashing slot (users.hashers)
+    if isinstance(exc, HashingBusy):
+        response = Response({
+            'success': False,
+            'message': str(exc)
+        }, status=503)
+        response['Retry-After'] = str(exc.retry_after)
+        return response
+    return drf_exception_handler(exc, context)
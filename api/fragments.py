@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from shopping.versioning import get_catalog_version
+
+# seconds between catalog version lookups, so a page of games costs one cache read instead of one per game
+VERSION_CHECK_INTERVAL = 1
+
+# per-process LRU of rendered games (the JSON bytes of api.renderers.JSONFragment), keyed by id, updated_at
+# and the fieldset. every catalog write moves updated_at (see shopping.signals), so entries don't go stale
+# on their own. writes that skip it (queryset.update) are covered by the catalog version: a new one
+# (any catalog write, or manage.py rebuild_search_index after a bulk update) empties the cache
+class FragmentCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._checked_at = None
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'GAME_FRAGMENT_CACHE_SIZE', 5000)
+
+    def _check_version(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < VERSION_CHECK_INTERVAL:
+            return
+        version = get_catalog_version()
+        with self._lock:
+            self._checked_at = now
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def get(self, key):
+        self._check_version()
+        with self._lock:
+            content = self._entries.get(key)
+            if content is not None:
+                self._entries.move_to_end(key)
+            return content
+
+    def set(self, key, content):
+        max_size = self.max_size
+        with self._lock:
+            self._entries[key] = content
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._checked_at = None
+
+    def __len__(self):
+        return len(self._entries)
+
+game_fragments = FragmentCache()
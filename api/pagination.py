@@ -0,0 +1,71 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+# sort_by query values -> (field, descending) for keyset pagination, the game id breaks ties
+CURSOR_SORT_KEYS = {
+    'release_date': ('release_date', True),
+    'price_asc': ('price', False),
+    'price_desc': ('price', True),
+    'title': ('title', False),
+}
+DEFAULT_CURSOR_SORT = 'release_date'
+
+class InvalidCursor(ValueError):
+    pass
+
+def get_cursor_sort(sort_by):
+    return sort_by if sort_by in CURSOR_SORT_KEYS else DEFAULT_CURSOR_SORT
+
+def encode_cursor(sort_by, game):
+    # the cursor is opaque to clients, it just records where the last page stopped
+    field, _ = CURSOR_SORT_KEYS[sort_by]
+    value = getattr(game, field)
+    payload = {
+        's': sort_by,
+        'v': value.isoformat() if hasattr(value, 'isoformat') else str(value),
+        'id': game.id,
+    }
+    encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode())
+    return encoded.decode().rstrip('=')
+
+def decode_cursor(cursor, sort_by):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, last_id = payload['v'], int(payload['id'])
+        cursor_sort = payload['s']
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor('Invalid cursor.')
+
+    # a cursor from one sort order means nothing under another
+    if cursor_sort != sort_by:
+        raise InvalidCursor('Cursor does not match the requested sort order.')
+    return value, last_id
+
+def get_cursor_queryset(games, sort_by, cursor, page_size):
+    # seeks straight past the last row instead of OFFSET, so deep pages cost the same as the first one
+    field, descending = CURSOR_SORT_KEYS[sort_by]
+    if descending:
+        games = games.order_by(f'-{field}', '-id')
+    else:
+        games = games.order_by(field, 'id')
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_by)
+        if descending:
+            games = games.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': last_id}))
+        else:
+            games = games.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': last_id}))
+
+    # one extra row to find out if there is a next page without counting
+    return games[:page_size + 1]
+
+def get_cursor_page(rows, sort_by, page_size):
+    # the fetched rows (see get_cursor_queryset) -> (page rows, next cursor or None)
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = encode_cursor(sort_by, rows[-1]) if has_next else None
+    return rows, next_cursor
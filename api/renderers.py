@@ -0,0 +1,54 @@
+import orjson
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+# anything orjson doesn't write exactly like JSONRenderer (dates/datetimes/times, Decimal, lazy
+# strings, querysets...) goes through DRF's encoder so the output matches
+_encoder = encoders.JSONEncoder()
+
+def _default(obj):
+    if isinstance(obj, JSONFragment):
+        return orjson.Fragment(obj.content)
+    # with OPT_PASSTHROUGH_SUBCLASS the ReturnDict/ReturnList/ErrorDetail subclasses land here too
+    if isinstance(obj, dict):
+        return dict(obj)
+    if isinstance(obj, list):
+        return list(obj)
+    if isinstance(obj, str):
+        return str(obj)
+    if isinstance(obj, int):
+        return int(obj)
+    return _encoder.default(obj)
+
+def _escape(content):
+    # same as JSONRenderer, these two are valid JSON but break javascript
+    return content.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+OPTIONS = orjson.OPT_PASSTHROUGH_SUBCLASS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+def dumps(data):
+    # compact utf-8 JSON, pre-rendered JSONFragments are spliced in as they are
+    return _escape(orjson.dumps(data, default=_default, option=OPTIONS))
+
+class JSONFragment(dict):
+    # serializer output that also carries its rendered JSON, so FastJSONRenderer copies the bytes
+    # instead of encoding the fields again. only the bytes are cached (api.fragments), every
+    # fragment gets its own dict, so changing one can't leak into the cache or other responses
+    __slots__ = ('content',)
+
+    def __init__(self, data, content=None):
+        super().__init__(data)
+        self.content = dumps(dict(self)) if content is None else content
+
+    @classmethod
+    def from_content(cls, content):
+        return cls(orjson.loads(content), content)
+
+class FastJSONRenderer(JSONRenderer):
+    # JSONRenderer on orjson. falls back to DRF's rendering when the client asked for indented output
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
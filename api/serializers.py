@@ -1,6 +1,8 @@
 from users.models import User, CreditCard, Address
 from shopping.models import Game, CartItem, Platform, Genre, OwnedGame, Order, OrderItem
 from rest_framework import serializers
+from .fragments import game_fragments
+from .renderers import JSONFragment
 from decimal import Decimal
 from datetime import datetime
 
@@ -14,9 +16,19 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ('id', 'username', 'email', 'first_name', 'last_name', 'cart_items', 'credit_cards', 'addresses')
         read_only_fields = ('id',)
 
+    # the nested sections, each costs its own query. ?include= picks which of them to load
+    SECTIONS = ('cart_items', 'credit_cards', 'addresses')
+
+    def __init__(self, *args, include=None, **kwargs):
+        # include=None keeps every section, otherwise only the listed ones are serialized
+        super().__init__(*args, **kwargs)
+        if include is not None:
+            for section in set(self.SECTIONS) - set(include):
+                self.fields.pop(section)
+
     def get_cart_items(self, obj):
-        cart_items = obj.cart_items.all()
-        return BasicUserCartItemSerializer(cart_items, many=True).data
+        # same shape as BasicUserCartItemSerializer, without building model instances
+        return list(obj.cart_items.summaries())
     
     def get_credit_cards(self, obj):
         credit_cards = obj.credit_cards.all()
@@ -40,11 +52,11 @@ class CreditCardSerializer(serializers.ModelSerializer):
 
     def get_cardNumber(self, obj):
         """Return decrypted card number for autofill (use carefully)"""
-        # Only return full card number for the card owner
+        # only decrypted when the client asks for autofill (?autofill=true), and only for the card owner
         request = self.context.get('request')
-        if request and request.user == obj.user:
+        if request and request.user == obj.user and self.context.get('autofill'):
             return obj.get_decrypted_card_number()
-        return f"****{obj.last_four_digits}"
+        return obj.get_masked_card_number()
 
 class AddressSerializer(serializers.ModelSerializer):
     class Meta:
@@ -89,9 +101,59 @@ class GameSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('id',)
 
+    def __init__(self, *args, fields=None, **kwargs):
+        # fields trims the output to a sparse fieldset (see api.catalog.get_game_fields)
+        self.fieldset = tuple(fields) if fields is not None else None
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        # the trimming happens when the fields are first built, so a page served entirely
+        # from the fragment cache never builds them at all
+        fields = super().get_fields()
+        if self.fieldset is not None:
+            fields = {name: field for name, field in fields.items() if name in self.fieldset}
+        return fields
+
+    def to_representation(self, instance):
+        # rendered games are reused from the fragment cache (api.fragments) while their updated_at is
+        # the same. without updated_at loaded there's nothing safe to key on, so those are built fresh
+        if not game_fragments.max_size or instance.pk is None or 'updated_at' not in instance.__dict__:
+            return super().to_representation(instance)
+        key = (instance.pk, instance.updated_at, self.fieldset)
+        content = game_fragments.get(key)
+        if content is not None:
+            return JSONFragment.from_content(content)
+        fragment = JSONFragment(super().to_representation(instance))
+        game_fragments.set(key, fragment.content)
+        return fragment
+
     def get_image(self, obj):
         return obj.return_image_url()
     
+BULK_GAME_LIMIT = 250
+
+class BulkGameRequestSerializer(serializers.Serializer):
+    game_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=BULK_GAME_LIMIT,
+        error_messages={
+            'min_length': 'At least one game ID is required.',
+            'max_length': f'No more than {BULK_GAME_LIMIT} game IDs per request.',
+        }
+    )
+
+class CartBatchSerializer(serializers.Serializer):
+    add = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=BULK_GAME_LIMIT)
+    remove = serializers.ListField(child=serializers.IntegerField(), required=False, default=list, max_length=BULK_GAME_LIMIT)
+
+    def validate(self, data):
+        if not data['add'] and not data['remove']:
+            raise serializers.ValidationError('Nothing to add or remove.')
+        if set(data['add']) & set(data['remove']):
+            raise serializers.ValidationError("A game can't be added and removed in the same request.")
+        return data
+
 class CartDetailItemSerializer(serializers.ModelSerializer):
     game = GameSerializer()
 
@@ -115,6 +177,8 @@ class OrderCreateSerializer(serializers.Serializer):
         error_messages={'min_length': 'At least one game ID is required.'}
     )
     form_data = serializers.DictField()
+    # can also come in as an Idempotency-Key header
+    idempotency_key = serializers.CharField(max_length=64, required=False)
 
     def validate_form_data(self, value):
         # validate that cvv is provided for payment processing
@@ -130,35 +194,6 @@ class OrderCreateSerializer(serializers.Serializer):
         # if detected then just validate it, as i have no means of actually processing the payment. cvv is also never stored for security purposes
         return value
 
-    def validate_game_ids(self, value):
-        user = self.context['request'].user
-        
-        games = Game.objects.filter(id__in=value)
-        if len(games) != len(value):
-            raise serializers.ValidationError("One or more games not found.")
-        
-        owned_games = OwnedGame.objects.filter(
-            user=user, 
-            game__in=games
-        ).values_list('game_id', flat=True)
-        
-        if owned_games:
-            owned_game_titles = games.filter(id__in=owned_games).values_list('title', flat=True)
-            raise serializers.ValidationError(
-                f'You already own the following games: {", ".join(owned_game_titles)}'
-            )
-        
-        return value
-
-    def calculate_total_amount(self, games):
-        total_amount = Decimal('0.00')
-        for game in games:
-            if game.is_sale and game.sale_price:
-                total_amount += game.sale_price
-            else:
-                total_amount += game.price
-        return total_amount
-
 class CreditCardCreateSerializer(serializers.ModelSerializer):
     expiryDate = serializers.CharField(write_only=True)
     nameOnCard = serializers.CharField(source='name_on_card')
@@ -217,7 +252,8 @@ class CreditCardCreateSerializer(serializers.ModelSerializer):
         # instead we'll just assume that this is a valid card and that the CVV was provided
         
         validated_data['expiration_date'] = expiry_date
-        validated_data['user'] = self.context['request'].user
+        # saved from a background task, so the user comes in the context rather than a request
+        validated_data['user'] = self.context['user']
         
         # check if the card hash already exists, this is to prevent duplicate cards
         import hashlib
@@ -244,7 +280,7 @@ class AddressCreateSerializer(serializers.ModelSerializer):
         fields = ('street_address', 'suburb', 'city', 'postcode', 'country')
 
     def create(self, validated_data):
-        user = self.context['request'].user
+        user = self.context['user']
         validated_data['user'] = user
         
         existing_address = Address.objects.filter(
@@ -276,10 +312,43 @@ class OrderSerializer(serializers.ModelSerializer):
         model = Order
         fields = ('id', 'total_amount', 'order_date', 'order_items')
 
+class CompactOrderItemSerializer(serializers.ModelSerializer):
+    # the title and image as they were at checkout, no live game lookup
+    title = serializers.CharField(source='game_title')
+    image = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderItem
+        fields = ('id', 'game_id', 'title', 'image', 'purchase_price', 'quantity')
+        read_only_fields = fields
+
+    def get_image(self, obj):
+        return obj.return_image_url()
+
+class CompactOrderSerializer(serializers.ModelSerializer):
+    order_items = CompactOrderItemSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = Order
+        fields = ('id', 'total_amount', 'order_date', 'order_items')
+
 class CreateUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('username', 'email', 'password', 'first_name', 'last_name')
         extra_kwargs = {
             'password': {'write_only': True, 'min_length': 8},
-        }
\ No newline at end of file
+            # uniqueness is left to the database constraints (see UserSignUp), which unlike an
+            # exists() check can't be raced. unique_error() gives back the same messages
+            'username': {'validators': [User.username_validator]},
+            'email': {'validators': []},
+        }
+
+    @staticmethod
+    def unique_error(field_name):
+        # the message DRF's UniqueValidator would have given for the field
+        field = User._meta.get_field(field_name)
+        return {field_name: [field.error_messages['unique'] % {
+            'model_name': User._meta.verbose_name,
+            'field_label': field.verbose_name,
+        }]}
\ No newline at end of file
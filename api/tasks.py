@@ -0,0 +1,116 @@
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MAX_WORKERS': 2,
+    'MAX_RETRIES': 3,
+    'RETRY_BACKOFF': 0.5,
+    'EAGER': False,
+}
+
+def get_task_settings():
+    return {**DEFAULTS, **getattr(settings, 'TASK_RUNNER', {})}
+
+# small in-process job queue for work that doesn't need to hold up the response.
+# jobs run on a thread pool after the surrounding transaction commits and are retried with
+# exponential backoff; every outcome is logged and counted, see task_metrics()
+class TaskRunner:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._metrics = Counter()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=get_task_settings()['MAX_WORKERS'],
+                    thread_name_prefix='tasks',
+                )
+            return self._executor
+
+    def _count(self, name, outcome):
+        with self._lock:
+            self._metrics[f'{name}.{outcome}'] += 1
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics)
+
+    def reset_metrics(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def run(self, func, *args, **kwargs):
+        # runs func with retries in the calling thread
+        options = get_task_settings()
+        name = func.__name__
+        for attempt in range(options['MAX_RETRIES'] + 1):
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                if attempt == options['MAX_RETRIES']:
+                    logger.exception('Task %s failed after %s attempts', name, attempt + 1)
+                    self._count(name, 'failed')
+                    return False
+                logger.warning('Task %s failed (attempt %s), retrying', name, attempt + 1, exc_info=True)
+                self._count(name, 'retried')
+                time.sleep(options['RETRY_BACKOFF'] * 2 ** attempt)
+            else:
+                self._count(name, 'succeeded')
+                return True
+
+    def _run_in_worker(self, func, *args, **kwargs):
+        # worker threads get their own db connections, don't leave them open between jobs
+        close_old_connections()
+        try:
+            return self.run(func, *args, **kwargs)
+        finally:
+            connections.close_all()
+
+    def submit(self, func, *args, **kwargs):
+        self._count(func.__name__, 'queued')
+        if get_task_settings()['EAGER']:
+            return self.run(func, *args, **kwargs)
+        return self._get_executor().submit(self._run_in_worker, func, *args, **kwargs)
+
+    def submit_on_commit(self, func, *args, **kwargs):
+        # queued only once the current transaction commits (straight away outside of one),
+        # so the job never sees data that could still be rolled back
+        transaction.on_commit(lambda: self.submit(func, *args, **kwargs))
+
+task_runner = TaskRunner()
+
+def task_metrics():
+    return task_runner.metrics()
+
+def save_card(user_id, card_data):
+    from users.models import User
+    from .serializers import CreditCardCreateSerializer
+
+    user = User.objects.get(pk=user_id)
+    serializer = CreditCardCreateSerializer(data=card_data, context={'user': user})
+    if not serializer.is_valid():
+        # bad card details won't get better with a retry
+        logger.warning('Not saving card for user %s: %s', user_id, serializer.errors)
+        return
+    serializer.save()
+
+def save_address(user_id, address_data):
+    from users.models import User
+    from .serializers import AddressCreateSerializer
+
+    user = User.objects.get(pk=user_id)
+    serializer = AddressCreateSerializer(data=address_data, context={'user': user})
+    if not serializer.is_valid():
+        logger.warning('Not saving address for user %s: %s', user_id, serializer.errors)
+        return
+    serializer.save()
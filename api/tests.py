@@ -1,3 +1,1171 @@
-from django.test import TestCase
+import json
+import os
+import runpy
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from backend import settings as settings_module
+from users.models import User, CreditCard, Address
+from shopping.models import Game, Platform, Genre, CartItem, OwnedGame, Order, OrderItem, OrderIdNode
+from shopping.order_ids import OrderIdGenerator, decode, NODE_BITS, SEQUENCE_BITS, MAX_NODE_ID, MAX_SEQUENCE
+from shopping import search
+from shopping.suggestions import suggestion_index
+from shopping.cart import get_cart_totals
+from shopping.checkout import place_order
+from shopping.facets import facet_index
+from api.tasks import task_runner
+from api import async_views
+from api.fragments import game_fragments
+from api import renderers
+from api.serializers import GameSerializer
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.renderers import JSONRenderer
+from unittest import mock
+from rest_framework.authtoken.models import Token
+
+
+def create_games(count, platforms=('PC', 'PS5'), genres=('ACTION', 'RPG')):
+    platform_objs = [Platform.objects.get_or_create(name=name)[0] for name in platforms]
+    genre_objs = [Genre.objects.get_or_create(name=name)[0] for name in genres]
+    games = []
+    for i in range(count):
+        game = Game.objects.create(
+            title=f'Game {i}',
+            developer='Developer',
+            publisher='Publisher',
+            description='A game used for testing.',
+            price=Decimal('59.99'),
+            release_date=date(2024, 1, 1 + i % 28),
+            image='games/test.jpg',
+            is_sale=i % 2 == 0,
+            sale_price=Decimal('39.99') if i % 2 == 0 else None,
+        )
+        game.platforms.set(platform_objs)
+        game.genres.set(genre_objs)
+        games.append(game)
+    return games
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        # caches live outside the test transaction, so start every test from a clean slate
+        for cache in caches.all():
+            cache.clear()
+        suggestion_index.clear()
+        facet_index.clear()
+        game_fragments.clear()
+        self.client = APIClient()
+
+
+class CatalogQueryCountTests(APITestCase):
+    """Pins every game-serializing endpoint to a fixed number of queries, however many rows it returns."""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+
+    def assertConstantQueries(self, num, populate, request, sizes=(1, 5)):
+        # populates the database with each size in turn and checks the request cost stays the same
+        for size in sizes:
+            with self.subTest(rows=size):
+                populate(size)
+                with self.assertNumQueries(num):
+                    response = request()
+                self.assertEqual(response.status_code, 200)
+
+    def reset_catalog(self, size):
+        Game.objects.all().delete()
+        return create_games(size)
+
+    def test_all_games(self):
+        self.assertConstantQueries(
+            4,
+            self.reset_catalog,
+            lambda: self.client.get(reverse('api:all_games')),
+        )
+
+    def test_all_games_with_filters(self):
+        # the first request after a catalog write also rebuilds the facet index (three queries)
+        self.assertConstantQueries(
+            6,
+            self.reset_catalog,
+            lambda: self.client.get(reverse('api:all_games'), {'platform': 'PC', 'sort_by': 'title'}),
+        )
+        with self.assertNumQueries(3):
+            self.client.get(reverse('api:all_games'), {'platform': 'PS5', 'sort_by': 'title'})
+
+    def test_specific_game(self):
+        games = create_games(1)
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('api:specific_game'), {'game_id': games[0].id}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_view_cart(self):
+        def populate(size):
+            for game in self.reset_catalog(size):
+                CartItem.objects.create(user=self.user, game=game)
+
+        self.assertConstantQueries(4, populate, lambda: self.client.get(reverse('api:view_cart')))
+
+    def test_add_to_cart(self):
+        def populate(size):
+            games = self.reset_catalog(size + 1)
+            for game in games[1:]:
+                CartItem.objects.create(user=self.user, game=game)
+            self.new_game = games[0]
+
+        # cart read, game/ownership check, insert (wrapped in a savepoint)
+        self.assertConstantQueries(
+            5,
+            populate,
+            lambda: self.client.post(reverse('api:add_game_to_cart'), {'game_id': self.new_game.id}, format='json'),
+        )
+
+    def test_remove_from_cart(self):
+        def populate(size):
+            games = self.reset_catalog(size)
+            for game in games:
+                CartItem.objects.create(user=self.user, game=game)
+            self.removed_game = games[0]
+
+        self.assertConstantQueries(
+            2,
+            populate,
+            lambda: self.client.delete(reverse('api:add_game_to_cart'), {'game_id': self.removed_game.id}, format='json'),
+        )
+
+    def test_user_cart_items(self):
+        def populate(size):
+            for game in self.reset_catalog(size):
+                CartItem.objects.create(user=self.user, game=game)
+
+        self.assertConstantQueries(
+            2,
+            populate,
+            lambda: self.client.get(reverse('api:user'), {'include': 'cart_items'}),
+        )
+
+    def test_owned_games(self):
+        def populate(size):
+            for game in self.reset_catalog(size):
+                OwnedGame.objects.create(user=self.user, game=game)
+
+        self.assertConstantQueries(3, populate, lambda: self.client.get(reverse('api:owned_games')))
+
+    def test_order_list(self):
+        def populate(size):
+            Order.objects.all().delete()
+            for game in self.reset_catalog(size):
+                order = Order.objects.create(user=self.user, total_amount=game.price, is_completed=True)
+                OrderItem.objects.create(order=order, game=game, purchase_price=game.price)
+
+        self.assertConstantQueries(5, populate, lambda: self.client.get(reverse('api:order_info')))
+
+    def test_order_detail(self):
+        order = Order.objects.create(user=self.user, total_amount=Decimal('0.00'), is_completed=True)
+        for game in create_games(5):
+            OrderItem.objects.create(order=order, game=game, purchase_price=game.price)
+
+        with self.assertNumQueries(4):
+            response = self.client.post(reverse('api:order_info'), {'order_id': order.id}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['data']['order_items']), 5)
+
+
+class CursorPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        # release dates repeat every 28 games, so every sort key has ties for the id to break
+        self.games = create_games(30)
+
+    def collect_pages(self, params):
+        seen = []
+        cursor = ''
+        while True:
+            response = self.client.get(reverse('api:all_games'), {**params, 'cursor': cursor, 'page_size': 7})
+            self.assertEqual(response.status_code, 200)
+            pagination = response.data['data']['pagination']
+            seen.extend(game['id'] for game in response.data['data']['games'])
+            if not pagination['has_next']:
+                return seen
+            cursor = pagination['next_cursor']
+
+    def test_walks_every_game_once_for_each_sort(self):
+        for sort_by in ('release_date', 'price_asc', 'price_desc', 'title'):
+            with self.subTest(sort_by=sort_by):
+                seen = self.collect_pages({'sort_by': sort_by})
+                self.assertEqual(len(seen), len(self.games))
+                self.assertEqual(set(seen), {game.id for game in self.games})
+
+    def test_matches_offset_ordering(self):
+        seen = self.collect_pages({'sort_by': 'title'})
+        expected = list(Game.objects.order_by('title', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_skips_count_unless_requested(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('api:all_games'), {'cursor': ''})
+        self.assertNotIn('total_games', response.data['data']['pagination'])
+
+        response = self.client.get(reverse('api:all_games'), {'cursor': '', 'include_total': 'true'})
+        self.assertEqual(response.data['data']['pagination']['total_games'], 30)
+
+    def test_rejects_cursor_from_another_sort(self):
+        response = self.client.get(reverse('api:all_games'), {'cursor': '', 'page_size': 5, 'sort_by': 'title'})
+        cursor = response.data['data']['pagination']['next_cursor']
+
+        response = self.client.get(reverse('api:all_games'), {'cursor': cursor, 'sort_by': 'price_asc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_garbage_cursor(self):
+        response = self.client.get(reverse('api:all_games'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SearchIndexTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.zelda = create_games(1)[0]
+        self.zelda.title = 'The Legend of Zelda'
+        self.zelda.developer = 'Nintendo'
+        self.zelda.save()
+        self.other = create_games(1)[0]
+        self.other.description = 'Nothing like Zelda at all.'
+        self.other.save()
+
+    def search(self, query):
+        return search.search_game_ids(query)
+
+    def test_prefix_match_ranks_title_first(self):
+        self.assertEqual(self.search('zel'), [self.zelda.id, self.other.id])
+        self.assertEqual(self.search('legend zel'), [self.zelda.id])
+
+    def test_matches_developer(self):
+        self.assertEqual(self.search('ninten'), [self.zelda.id])
+
+    def test_follows_saves_and_deletes(self):
+        self.zelda.title = 'Metroid Dread'
+        self.zelda.save()
+        self.assertEqual(self.search('metroid'), [self.zelda.id])
+        self.assertEqual(self.search('legend'), [])
+
+        self.zelda.delete()
+        self.assertEqual(self.search('metroid'), [])
+
+    def test_all_games_search_filter(self):
+        response = self.client.get(reverse('api:all_games'), {'search': 'zelda'})
+        self.assertEqual([game['id'] for game in response.data['data']['games']], [self.zelda.id, self.other.id])
+
+    def test_substring_title_matches_rank_after_the_index(self):
+        # the index only matches word prefixes, titles containing the query still turn up after those
+        minecraft = create_games(1)[0]
+        minecraft.title = 'Minecraft'
+        minecraft.save()
+        crafted = create_games(1)[0]
+        crafted.title = 'Crafting Life'
+        crafted.save()
+        response = self.client.get(reverse('api:all_games'), {'search': 'craft'})
+        self.assertEqual([game['id'] for game in response.data['data']['games']], [crafted.id, minecraft.id])
+
+    def test_search_pages_and_counts_every_match(self):
+        # ranking happens in the query, so later pages and the total cover every match
+        create_games(3)
+        response = self.client.get(reverse('api:all_games'), {'search': 'game', 'page': 2, 'page_size': 2})
+        data = response.data['data']
+        self.assertEqual(data['pagination']['total_games'], 5)
+        self.assertEqual(len(data['games']), 2)
+
+        first = self.client.get(reverse('api:all_games'), {'search': 'game', 'page': 1, 'page_size': 2}).data['data']
+        seen = [game['id'] for game in first['games'] + data['games']]
+        self.assertEqual(len(set(seen)), 4)
+
+
+class SearchSuggestionTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.games = create_games(3)
+        for game, title in zip(self.games, ('Zelda Tears of the Kingdom', 'The Legend of Zelda', 'Mario Kart')):
+            game.title = title
+            game.save()
+        suggestion_index.clear()
+
+    def suggest(self, query):
+        response = self.client.get(reverse('api:search_suggestions'), {'query': query})
+        self.assertEqual(response.status_code, 200)
+        return [item['title'] for item in response.data['data']]
+
+    def test_suggestions_skip_the_database_once_loaded(self):
+        self.suggest('zel')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.suggest('zel'), ['Zelda Tears of the Kingdom', 'The Legend of Zelda'])
+        self.assertEqual(self.suggest('legend zel'), ['The Legend of Zelda'])
+        self.assertEqual(self.suggest('kart mar'), ['Mario Kart'])
+
+    def test_follows_committed_changes(self):
+        self.suggest('zel')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.games[2].title = 'Zelda Skyward Sword'
+            self.games[2].save()
+            self.games[0].delete()
+        self.assertEqual(self.suggest('zel'), ['Zelda Skyward Sword', 'The Legend of Zelda'])
+        self.assertEqual(self.suggest('mario'), [])
+
+    def test_substring_matches_fill_up_the_suggestions(self):
+        self.assertEqual(self.suggest('ingdom'), ['Zelda Tears of the Kingdom'])
+        self.assertEqual(self.suggest('ar'), ['Mario Kart', 'Zelda Tears of the Kingdom'])
+
+    def test_changes_during_a_rebuild_are_kept(self):
+        load_rows = suggestion_index._load_rows
+
+        def load_then_change():
+            # the rows are read, then a rename and a delete commit before the new index is swapped in
+            rows = load_rows()
+            suggestion_index.update_game(self.games[2].id, 'Zelda Skyward Sword')
+            suggestion_index.remove_game(self.games[0].id)
+            return rows
+
+        with mock.patch.object(suggestion_index, '_load_rows', side_effect=load_then_change):
+            suggestion_index.rebuild()
+        self.assertEqual(self.suggest('zel'), ['Zelda Skyward Sword', 'The Legend of Zelda'])
+        self.assertEqual(self.suggest('mario'), [])
+
+    @override_settings(SEARCH_SUGGESTIONS={'MEMORY_BUDGET': 1, 'MAX_PREFIX_LENGTH': 12})
+    def test_memory_budget_shortens_prefixes(self):
+        suggestion_index.clear()
+        self.assertEqual(self.suggest('kingdom'), ['Zelda Tears of the Kingdom'])
+        self.assertEqual(suggestion_index.stats()['max_prefix_length'], 1)
+
+
+class CartTotalsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        # game 0 is on sale for 39.99, game 1 is full price at 59.99
+        self.games = create_games(2)
+        for game in self.games:
+            CartItem.objects.create(user=self.user, game=game)
+
+    def subtotal(self):
+        response = self.client.get(reverse('api:view_cart'))
+        return Decimal(response.data['data']['cart_subtotal'])
+
+    def test_uses_sale_prices(self):
+        self.assertEqual(self.subtotal(), Decimal('99.98'))
+
+    def test_cached_until_the_cart_changes(self):
+        self.subtotal()
+        with self.assertNumQueries(0):
+            get_cart_totals(self.user)
+
+        CartItem.objects.filter(game=self.games[0]).delete()
+        self.assertEqual(self.subtotal(), Decimal('59.99'))
+
+    def test_price_change_invalidates(self):
+        self.subtotal()
+        self.games[1].is_sale = True
+        self.games[1].sale_price = Decimal('9.99')
+        self.games[1].save()
+        self.assertEqual(self.subtotal(), Decimal('49.98'))
+
+    def test_user_view_matches(self):
+        response = self.client.get(reverse('api:user'))
+        self.assertEqual(Decimal(response.data['data']['cart_subtotal']), Decimal('99.98'))
+
+
+class UserSummaryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        for game in create_games(2):
+            CartItem.objects.create(user=self.user, game=game)
+
+    def test_summary_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api:user'), {'include': ''})
+        data = response.data['data']
+        self.assertEqual(data['username'], 'tester')
+        self.assertEqual(data['cart_count'], 2)
+        self.assertEqual(Decimal(data['cart_subtotal']), Decimal('99.98'))
+        for section in ('cart_items', 'credit_cards', 'addresses'):
+            self.assertNotIn(section, data)
+
+    def test_selected_sections(self):
+        response = self.client.get(reverse('api:user'), {'include': 'cart_items'})
+        self.assertEqual(len(response.data['data']['cart_items']), 2)
+        self.assertNotIn('addresses', response.data['data'])
+
+    def test_everything_by_default(self):
+        response = self.client.get(reverse('api:user'))
+        for section in ('cart_items', 'credit_cards', 'addresses'):
+            self.assertIn(section, response.data['data'])
+
+    def test_unknown_section(self):
+        response = self.client.get(reverse('api:user'), {'include': 'orders'})
+        self.assertEqual(response.status_code, 400)
+
+
+class EditCartTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.games = create_games(3)
+        self.item = CartItem.objects.create(user=self.user, game=self.games[0])
+
+    def edit(self, method, game_id):
+        return getattr(self.client, method)(reverse('api:add_game_to_cart'), {'game_id': game_id}, format='json')
+
+    def test_add_returns_updated_cart(self):
+        response = self.edit('post', self.games[1].id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data'], list(CartItem.objects.filter(user=self.user).summaries()))
+        self.assertEqual([item['game_id'] for item in response.data['data']], [self.games[0].id, self.games[1].id])
+
+    def test_add_rejections(self):
+        OwnedGame.objects.create(user=self.user, game=self.games[2])
+        self.assertEqual(self.edit('post', self.games[0].id).data['message'], 'Game is already in the cart.')
+        self.assertEqual(self.edit('post', self.games[2].id).data['message'], 'Game is already owned.')
+        self.assertEqual(self.edit('post', self.games[2].id + 100).status_code, 404)
+        self.assertEqual(self.edit('post', 'abc').status_code, 400)
+
+    def test_remove_returns_updated_cart_and_invalidates_totals(self):
+        self.assertEqual(get_cart_totals(self.user)['item_count'], 1)
+        response = self.edit('delete', self.games[0].id)
+        self.assertEqual(response.data['data'], [])
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(get_cart_totals(self.user)['item_count'], 0)
+        self.assertEqual(self.edit('delete', self.games[0].id).status_code, 404)
+
+
+class CatalogResponseCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.games = create_games(3)
+
+    def test_repeat_anonymous_requests_skip_the_orm(self):
+        first = self.client.get(reverse('api:all_games'), {'sort_by': 'title', 'page': 1})
+        with self.assertNumQueries(0):
+            second = self.client.get(reverse('api:all_games'), {'page': 1, 'sort_by': 'title'})
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(reverse('api:all_games'))['ETag']
+        response = self.client.get(reverse('api:all_games'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_catalog_writes_bump_the_version(self):
+        etag = self.client.get(reverse('api:all_games'))['ETag']
+        self.games[0].title = 'Renamed'
+        self.games[0].save()
+
+        response = self.client.get(reverse('api:all_games'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Renamed', [game['title'] for game in response.data['data']['games']])
+
+        # m2m edits count as catalog writes too
+        etag = response['ETag']
+        self.games[0].platforms.clear()
+        response = self.client.get(reverse('api:all_games'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_specific_game_is_cached_per_game(self):
+        url = reverse('api:specific_game')
+        self.client.post(url, {'game_id': self.games[0].id}, format='json')
+        with self.assertNumQueries(0):
+            response = self.client.post(url, {'game_id': self.games[0].id}, format='json')
+        self.assertEqual(response.data['data']['id'], self.games[0].id)
+
+        response = self.client.post(url, {'game_id': self.games[1].id}, format='json')
+        self.assertEqual(response.data['data']['id'], self.games[1].id)
+
+    def test_authenticated_requests_bypass_the_cache(self):
+        user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.get(reverse('api:all_games'))
+        self.client.force_authenticate(user)
+        with self.assertNumQueries(4):
+            self.client.get(reverse('api:all_games'))
+
+    def test_per_process_cache_expires_quickly(self):
+        # other workers' writes never reach a locmem cache, so its entries can't live long
+        environ = {key: value for key, value in os.environ.items() if not key.startswith('CATALOG_CACHE_')}
+        with mock.patch.dict(os.environ, environ, clear=True):
+            self.assertEqual(runpy.run_path(settings_module.__file__)['CACHES']['catalog']['TIMEOUT'], 10)
+        with mock.patch.dict(os.environ, {**environ, 'CATALOG_CACHE_BACKEND': 'django.core.cache.backends.redis.RedisCache'}, clear=True):
+            self.assertEqual(runpy.run_path(settings_module.__file__)['CACHES']['catalog']['TIMEOUT'], 60 * 60)
+
+    def test_varies_on_every_credential_header(self):
+        # session logins come in on the Cookie header, shared caches have to keep those apart too
+        user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        response = self.client.get(reverse('api:all_games'))
+        self.assertIn('Cookie', response['Vary'])
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('api:all_games'))
+        self.assertIn('Cookie', response['Vary'])
+
+
+class GameDetailTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.game = create_games(1)[0]
+        self.url = reverse('api:game_detail', args=[self.game.id])
+
+    def test_sends_validators_and_cache_control(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['id'], self.game.id)
+        self.assertTrue(response['ETag'].startswith(f'"{self.game.id}-'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('public', response['Cache-Control'])
+
+    def test_matching_etag_skips_serializing(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_m2m_changes_move_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.game.genres.clear()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['genres'], [])
+
+        etag = response['ETag']
+        Platform.objects.get(name='PC').games.clear()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_platform_and_genre_deletes_move_the_etag(self):
+        for related in (Platform.objects.get(name='PC'), Genre.objects.get(name='RPG')):
+            with self.subTest(related=related):
+                etag = self.client.get(self.url)['ETag']
+                related.delete()
+                response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_missing_game(self):
+        response = self.client.get(reverse('api:game_detail', args=[self.game.id + 1]))
+        self.assertEqual(response.status_code, 404)
+
+
+class BulkGameInfoTests(APITestCase):
+    def test_fixed_queries_and_not_found_markers(self):
+        games = create_games(5)
+        missing_id = games[-1].id + 100
+        game_ids = [games[3].id, missing_id, games[0].id, games[3].id]
+
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('api:bulk_games'), {'game_ids': game_ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([game['id'] for game in response.data['data']['games']], [games[3].id, games[0].id])
+        self.assertEqual(response.data['data']['not_found'], [missing_id])
+
+    def test_matches_specific_game_output(self):
+        game = create_games(1)[0]
+        bulk = self.client.post(reverse('api:bulk_games'), {'game_ids': [game.id]}, format='json')
+        single = self.client.post(reverse('api:specific_game'), {'game_id': game.id}, format='json')
+        self.assertEqual(bulk.data['data']['games'][0], single.data['data'])
+
+    def test_rejects_oversized_batches(self):
+        response = self.client.post(reverse('api:bulk_games'), {'game_ids': list(range(1, 300))}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.games = create_games(3)
+
+    def test_fields_trims_payload_and_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api:all_games'), {'fields': 'title,price,image,is_sale'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['data']['games'][0]), {'id', 'title', 'price', 'image', 'is_sale'})
+        # no description column and no platform/genre prefetches
+        self.assertEqual(len(queries), 2)
+        self.assertNotIn('description', queries[1]['sql'])
+        # a projection on its own keeps the unfiltered pagination block
+        self.assertEqual(response.data['data']['pagination']['total_games'], 3)
+
+    def test_exclude(self):
+        response = self.client.get(reverse('api:all_games'), {'exclude': 'description,genres', 'sort_by': 'title'})
+        game = response.data['data']['games'][0]
+        self.assertNotIn('description', game)
+        self.assertNotIn('genres', game)
+        self.assertIn('platforms', game)
+
+    def test_cursor_mode_with_projection(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api:all_games'), {'cursor': '', 'page_size': 2, 'fields': 'title', 'sort_by': 'price_asc'})
+        self.assertEqual(set(response.data['data']['games'][0]), {'id', 'title'})
+        self.assertIsNotNone(response.data['data']['pagination']['next_cursor'])
+
+    def test_detail_endpoints(self):
+        game = self.games[0]
+        response = self.client.get(reverse('api:game_detail', args=[game.id]), {'fields': 'title'})
+        self.assertEqual(response.data['data'], {'id': game.id, 'title': game.title})
+
+        response = self.client.post(reverse('api:specific_game') + '?fields=price', {'game_id': game.id}, format='json')
+        self.assertEqual(set(response.data['data']), {'id', 'price'})
+
+        response = self.client.post(reverse('api:bulk_games') + '?exclude=description', {'game_ids': [game.id]}, format='json')
+        self.assertNotIn('description', response.data['data']['games'][0])
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('api:all_games'), {'fields': 'title,password'})
+        self.assertEqual(response.status_code, 400)
+
+
+class FacetIndexTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        # three PC/ACTION games (the even ones on sale) and two PS5/RPG games
+        self.pc_games = create_games(3, platforms=('PC',), genres=('ACTION',))
+        self.ps5_games = create_games(2, platforms=('PS5',), genres=('RPG',))
+
+    def get_games(self, params):
+        return self.client.get(reverse('api:all_games'), {**params, 'page': 1})
+
+    def test_filters_by_set_intersection(self):
+        response = self.get_games({'platform': 'PC', 'is_sale': 'true'})
+        self.assertEqual(
+            {game['id'] for game in response.data['data']['games']},
+            {self.pc_games[0].id, self.pc_games[2].id},
+        )
+        self.assertEqual(response.data['data']['pagination']['total_games'], 2)
+
+    def test_facet_counts(self):
+        response = self.get_games({'facets': 'true', 'genre': 'ACTION'})
+        self.assertEqual(response.data['data']['facets'], {
+            'platforms': {'PC': 3},
+            'genres': {'ACTION': 3},
+            'on_sale': 2,
+        })
+
+        response = self.client.get(reverse('api:all_games'), {'facets': 'true'})
+        self.assertEqual(response.data['data']['facets']['platforms'], {'PC': 3, 'PS5': 2})
+        self.assertEqual(response.data['data']['pagination']['total_games'], 5)
+
+    def test_rebuilds_after_catalog_writes(self):
+        self.assertEqual(len(self.get_games({'platform': 'PS5'}).data['data']['games']), 2)
+        self.pc_games[1].platforms.add(Platform.objects.get(name='PS5'))
+        self.assertEqual(len(self.get_games({'platform': 'PS5'}).data['data']['games']), 3)
+
+    @override_settings(FACET_INDEX_MAX_AGE=0)
+    def test_rebuilds_after_max_age(self):
+        # writes made in another worker never bump this worker's (locmem) catalog version
+        self.assertEqual(len(self.get_games({'platform': 'PS5'}).data['data']['games']), 2)
+        with mock.patch('shopping.signals.bump_catalog_version'):
+            self.pc_games[1].platforms.add(Platform.objects.get(name='PS5'))
+        caches['catalog'].clear()
+        response = self.client.get(reverse('api:all_games'), {'platform': 'PS5'})
+        self.assertEqual(response.data['data']['pagination']['total_games'], 3)
+
+    def test_large_matches_are_one_parameter(self):
+        # well past the point where one parameter per id would be a problem, and without the m2m joins
+        pc = Platform.objects.get(name='PC')
+        games = Game.objects.bulk_create([
+            Game(title=f'Bulk {i}', developer='Developer', publisher='Publisher', description='Bulk.',
+                 price=Decimal('9.99'), release_date=date(2024, 1, 1), image='games/test.jpg')
+            for i in range(1200)
+        ])
+        Game.platforms.through.objects.bulk_create([Game.platforms.through(game=game, platform=pc) for game in games])
+        facet_index.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api:all_games'), {'platform': 'PC', 'page': 3, 'page_size': 500})
+        data = response.data['data']
+        self.assertEqual(data['pagination']['total_games'], 1203)
+        self.assertEqual(data['pagination']['total_pages'], 3)
+        self.assertEqual(len(data['games']), 203)
+        page_query = next(query['sql'] for query in queries if 'json_each' in query['sql'])
+        self.assertNotIn('"shopping_platform"."name"', page_query)
+
+    def test_unknown_platform(self):
+        self.assertEqual(self.get_games({'platform': 'DREAMCAST'}).status_code, 404)
+
+
+class OrderHistoryTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        games = create_games(3)
+        for _ in range(5):
+            order = Order.objects.create(user=self.user, total_amount=Decimal('0.00'), is_completed=True)
+            for game in games:
+                item = OrderItem(order=order, game=game, purchase_price=game.price)
+                item.snapshot_game()
+                item.save()
+
+    def test_paginates_in_fixed_queries(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('api:order_history'), {'page': 2, 'page_size': 2})
+        data = response.data['data']
+        self.assertEqual(len(data['orders']), 2)
+        self.assertEqual(len(data['orders'][0]['order_items']), 3)
+        self.assertEqual(data['pagination']['total_orders'], 5)
+        self.assertTrue(data['pagination']['has_next'])
+
+    def test_compact_items_use_the_snapshot(self):
+        Game.objects.update(title='Renamed later')
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('api:order_history'), {'compact': 'true', 'page_size': 10})
+        item = response.data['data']['orders'][0]['order_items'][0]
+        self.assertEqual(set(item), {'id', 'game_id', 'title', 'image', 'purchase_price', 'quantity'})
+        self.assertTrue(item['title'].startswith('Game '))
+
+
+class CheckoutTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        # game 0 is on sale for 39.99, game 1 is full price at 59.99
+        self.games = create_games(2)
+        for game in self.games:
+            CartItem.objects.create(user=self.user, game=game)
+
+    def checkout(self, game_ids, **extra):
+        payload = {'game_ids': game_ids, 'form_data': {'cardDetails': {'cvv': '123'}}}
+        return self.client.post(reverse('api:create_order'), payload, format='json', **extra)
+
+    def test_creates_priced_order_and_clears_cart(self):
+        response = self.checkout([game.id for game in self.games])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Decimal(response.data['data']['total_amount']), Decimal('99.98'))
+        self.assertEqual(len(response.data['data']['order_items']), 2)
+        self.assertEqual(OwnedGame.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+    def test_idempotency_key_returns_the_original_order(self):
+        first = self.checkout([self.games[0].id], HTTP_IDEMPOTENCY_KEY='abc123')
+        second = self.checkout([self.games[0].id], HTTP_IDEMPOTENCY_KEY='abc123')
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.data['data']['id'], second.data['data']['id'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_reused_key_with_a_different_order_is_refused(self):
+        self.checkout([self.games[0].id], HTTP_IDEMPOTENCY_KEY='abc123')
+        response = self.checkout([self.games[1].id], HTTP_IDEMPOTENCY_KEY='abc123')
+        self.assertEqual(response.status_code, 422)
+        self.assertIn('idempotency_key', response.data['message'])
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertFalse(OwnedGame.objects.filter(game=self.games[1]).exists())
+
+    def test_double_submit_without_key_leaves_no_orphans(self):
+        self.checkout([self.games[0].id])
+        response = self.checkout([self.games[0].id, self.games[1].id])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already own', response.data['message']['game_ids'][0])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_unknown_game(self):
+        response = self.checkout([self.games[0].id, self.games[1].id + 100])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], {'game_ids': ['One or more games not found.']})
+        self.assertFalse(Order.objects.exists())
+
+    def test_taken_order_id_is_replaced(self):
+        taken = Order.objects.create(user=self.user, total_amount=Decimal('0.00'))
+        with mock.patch('shopping.checkout.order_id_generator.next_id', side_effect=[taken.id, 'FRESHORDERID1']):
+            response = self.checkout([self.games[0].id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['id'], 'FRESHORDERID1')
+        self.assertEqual(Order.objects.count(), 2)
+
+
+class OrderIdTests(APITestCase):
+    NOW = 1767225600.123  # 2026-01-01 UTC
+
+    def frozen(self):
+        return mock.patch('shopping.order_ids.time.time', return_value=self.NOW)
+
+    def split(self, order_id):
+        # (milliseconds, node id, sequence)
+        value = decode(order_id)
+        return value >> (NODE_BITS + SEQUENCE_BITS), (value >> SEQUENCE_BITS) & MAX_NODE_ID, value & MAX_SEQUENCE
+
+    def test_monotonic_within_a_millisecond(self):
+        generator = OrderIdGenerator(node_id=5)
+        with self.frozen():
+            ids = [generator.next_id() for _ in range(100)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual(len({self.split(order_id)[0] for order_id in ids}), 1)
+        self.assertEqual([self.split(order_id)[2] for order_id in ids], list(range(100)))
+
+    def test_sequence_rollover_borrows_the_next_millisecond(self):
+        generator = OrderIdGenerator(node_id=5)
+        with self.frozen():
+            ids = [generator.next_id() for _ in range(MAX_SEQUENCE + 2)]
+        self.assertEqual(ids, sorted(set(ids)))
+        first_ms = self.split(ids[0])[0]
+        self.assertEqual(self.split(ids[-2]), (first_ms, 5, MAX_SEQUENCE))
+        self.assertEqual(self.split(ids[-1]), (first_ms + 1, 5, 0))
+
+    def test_generators_lease_their_own_node_ids(self):
+        # two workers generating in the same millisecond
+        first, second = OrderIdGenerator(), OrderIdGenerator()
+        with self.frozen():
+            ids = [generator.next_id() for _ in range(1000) for generator in (first, second)]
+        self.assertEqual(len(set(ids)), 2000)
+        self.assertEqual(len({self.split(order_id)[1] for order_id in ids}), 2)
+        self.assertEqual(OrderIdNode.objects.count(), 2)
+
+    def test_only_expired_leases_are_taken_over(self):
+        now = datetime.now(timezone.utc)
+        OrderIdNode.objects.bulk_create([
+            OrderIdNode(node_id=node_id, owner='other', expires_at=now + timedelta(minutes=5 if node_id != 7 else -5))
+            for node_id in range(MAX_NODE_ID + 1)
+        ])
+        self.assertEqual(self.split(OrderIdGenerator().next_id())[1], 7)
+        with self.assertRaises(RuntimeError):
+            OrderIdGenerator().next_id()
+
+    def test_leases_follow_the_database_clock(self):
+        # this host's clock running an hour fast mustn't make the other workers' leases look expired
+        now = datetime.now(timezone.utc)
+        OrderIdNode.objects.bulk_create([
+            OrderIdNode(node_id=node_id, owner='other', expires_at=now + timedelta(minutes=5 if node_id != 7 else -5))
+            for node_id in range(MAX_NODE_ID + 1)
+        ])
+        with mock.patch('django.utils.timezone.now', return_value=now + timedelta(hours=1)):
+            self.assertEqual(self.split(OrderIdGenerator().next_id())[1], 7)
+
+    def test_model_default_stays_off_the_database(self):
+        # forms, the admin and unsaved orders build Order() without wanting a lease
+        with self.assertNumQueries(0):
+            order = Order()
+        self.assertEqual(len(order.id), 13)
+        self.assertFalse(OrderIdNode.objects.exists())
+
+    def test_checkout_uses_a_leased_id(self):
+        user = User.objects.create_user(username='buyer', email='buyer@example.com', password='password123')
+        game = create_games(1)[0]
+        # a fresh generator, the shared one may hold a lease from a test whose rows are gone
+        with mock.patch('shopping.checkout.order_id_generator', OrderIdGenerator()):
+            order, created = place_order(user, [game.id])
+        node_id = self.split(order.id)[1]
+        self.assertTrue(OrderIdNode.objects.filter(node_id=node_id).exists())
+
+    def test_rolled_back_lease_is_taken_again(self):
+        generator = OrderIdGenerator()
+        with transaction.atomic():
+            generator.next_id()
+            transaction.set_rollback(True)
+        self.assertFalse(OrderIdNode.objects.exists())
+        node_id = self.split(generator.next_id())[1]
+        self.assertTrue(OrderIdNode.objects.filter(node_id=node_id).exists())
+
+
+class LegacyOrderIdMigrationTests(TransactionTestCase):
+    # orders from the old random generator keep their 8 character ids through the migration
+    migrate_from = [('shopping', '0010_order_idempotency_key')]
+
+    def test_legacy_orders_still_resolve(self):
+        executor = MigrationExecutor(connection)
+        migrate_to = executor.loader.graph.leaf_nodes()
+        executor.migrate(self.migrate_from)
+        apps = executor.loader.project_state(self.migrate_from).apps
+
+        user = apps.get_model('users', 'User').objects.create(username='legacy', email='legacy@example.com')
+        game = apps.get_model('shopping', 'Game').objects.create(
+            title='Old Game', developer='Developer', publisher='Publisher', description='Bought long ago.',
+            price=Decimal('9.99'), release_date=date(2020, 1, 1), image='games/test.jpg',
+        )
+        order = apps.get_model('shopping', 'Order').objects.create(
+            id='AB12CD34', user=user, total_amount=Decimal('9.99'), is_completed=True,
+        )
+        apps.get_model('shopping', 'OrderItem').objects.create(order=order, game=game, purchase_price=Decimal('9.99'))
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(migrate_to)
+
+        legacy = Order.objects.with_items().get(id='AB12CD34')
+        self.assertEqual([item.game_id for item in legacy.order_items.all()], [game.id])
+        new = Order.objects.create(user_id=user.id, total_amount=Decimal('0.00'))
+        self.assertEqual(len(new.id), 13)
+
+
+@override_settings(TASK_RUNNER={'EAGER': True, 'MAX_RETRIES': 2, 'RETRY_BACKOFF': 0})
+class CheckoutTaskTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        task_runner.reset_metrics()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.game = create_games(1)[0]
+
+    def checkout(self, **form_data):
+        form_data.setdefault('cardDetails', {'cvv': '123'})
+        payload = {'game_ids': [self.game.id], 'form_data': form_data}
+        return self.client.post(reverse('api:create_order'), payload, format='json')
+
+    def test_card_and_address_saved_after_commit(self):
+        card = {'nameOnCard': 'Test User', 'cardNumber': '4111 1111 1111 1111', 'expiryDate': '12/99', 'cvv': '123'}
+        address = {'street_address': '1 Test St', 'suburb': 'Suburb', 'city': 'City', 'postcode': '1234', 'country': 'NZ'}
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.checkout(cardDetails=card, address=address, saveCard=True, saveAddress=True)
+            self.assertEqual(response.status_code, 200)
+            # nothing is saved until the order has committed
+            self.assertFalse(CreditCard.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(CreditCard.objects.get(user=self.user).last_four_digits, '1111')
+        self.assertTrue(Address.objects.filter(user=self.user, city='City').exists())
+        metrics = task_runner.metrics()
+        self.assertEqual(metrics['save_card.succeeded'], 1)
+        self.assertEqual(metrics['save_address.succeeded'], 1)
+
+    def test_invalid_card_does_not_fail_the_order(self):
+        card = {'nameOnCard': 'Test User', 'cardNumber': 'not a card', 'expiryDate': '12/99', 'cvv': '123'}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.checkout(cardDetails=card, saveCard=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(CreditCard.objects.exists())
+
+    def test_failing_task_is_retried_then_counted(self):
+        calls = []
+        def flaky():
+            calls.append(1)
+            raise RuntimeError('boom')
+        with self.assertLogs('api.tasks', level='WARNING'):
+            self.assertFalse(task_runner.run(flaky))
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(task_runner.metrics(), {'flaky.retried': 2, 'flaky.failed': 1})
+
+
+class BatchEditCartTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        # even games are on sale for 39.99, odd ones are 59.99
+        self.games = create_games(6)
+        CartItem.objects.create(user=self.user, game=self.games[0])
+
+    def batch(self, add=(), remove=()):
+        payload = {'add': [game.id for game in add], 'remove': [game.id for game in remove]}
+        return self.client.post(reverse('api:batch_edit_cart'), payload, format='json')
+
+    def test_adds_and_removes(self):
+        self.assertEqual(get_cart_totals(self.user)['item_count'], 1)
+        response = self.batch(add=self.games[1:4], remove=self.games[:1])
+        self.assertEqual(response.status_code, 200)
+        game_ids = sorted(item['game_id'] for item in response.data['data']['cart_items'])
+        self.assertEqual(game_ids, [game.id for game in self.games[1:4]])
+        self.assertEqual(Decimal(response.data['data']['cart_subtotal']), Decimal('159.97'))
+
+    def test_constant_queries(self):
+        # ownership check, savepoint, insert, release, cart read, totals
+        for size in (1, 4):
+            with self.subTest(size=size):
+                CartItem.objects.filter(user=self.user).exclude(game=self.games[0]).delete()
+                with self.assertNumQueries(6):
+                    self.batch(add=self.games[1:1 + size])
+
+    def test_existing_items_are_skipped(self):
+        response = self.batch(add=self.games[:2])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+
+    def test_rejects_whole_batch(self):
+        OwnedGame.objects.create(user=self.user, game=self.games[5])
+        response = self.batch(add=self.games[4:6])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('already owned', response.data['message'])
+        response = self.client.post(reverse('api:batch_edit_cart'), {'add': [self.games[5].id + 100]}, format='json')
+        self.assertIn('not found', response.data['message'])
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 1)
+
+    def test_invalid_payloads(self):
+        self.assertEqual(self.batch().status_code, 400)
+        self.assertEqual(self.batch(add=self.games[1:2], remove=self.games[1:2]).status_code, 400)
+
+
+class AsyncCatalogViewTests(APITestCase):
+    """The async catalog views have to answer exactly like the DRF views they stand in for."""
+
+    def setUp(self):
+        super().setUp()
+        self.games = create_games(6)
+        self.factory = RequestFactory()
+
+    def clear_caches(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def call_async(self, view, request):
+        response = async_to_sync(view)(request)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def assertSameResponse(self, async_response, sync_response):
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(json.loads(async_response.content), json.loads(sync_response.content))
+
+    def test_all_games_matches_sync_view(self):
+        cases = [
+            {},
+            {'page': 2, 'page_size': 2},
+            {'platform': 'PC', 'sort_by': 'title'},
+            {'is_sale': 'true', 'page': 1, 'facets': 'true'},
+            {'platform': 'XBOX_ONE'},
+            {'search': 'Game 1'},
+            {'fields': 'title,price'},
+            {'cursor': '', 'page_size': 2, 'sort_by': 'price_asc', 'include_total': 'true'},
+            {'cursor': 'not-a-cursor'},
+            {'fields': 'nope'},
+        ]
+        for params in cases:
+            with self.subTest(params=params):
+                self.clear_caches()
+                async_response = self.call_async(async_views.all_games, self.factory.get('/api/games/all/', params))
+                self.clear_caches()
+                sync_response = self.client.get(reverse('api:all_games'), params)
+                self.assertSameResponse(async_response, sync_response)
+
+    def test_specific_game_matches_sync_view(self):
+        for payload in ({'game_id': self.games[0].id}, {'game_id': self.games[-1].id + 100}, {}):
+            with self.subTest(payload=payload):
+                self.clear_caches()
+                request = self.factory.post('/api/games/specific/', payload, content_type='application/json')
+                async_response = self.call_async(async_views.specific_game, request)
+                self.clear_caches()
+                sync_response = self.client.post(reverse('api:specific_game'), payload, format='json')
+                self.assertSameResponse(async_response, sync_response)
+
+    def test_search_suggestions_match_sync_view(self):
+        for params in ({'query': 'game'}, {}):
+            with self.subTest(params=params):
+                async_response = self.call_async(async_views.search_suggestions, self.factory.get('/api/search/suggestion/', params))
+                sync_response = self.client.get(reverse('api:search_suggestions'), params)
+                self.assertSameResponse(async_response, sync_response)
+
+    @override_settings(SEARCH_SUGGESTIONS={'MAX_AGE': 0})
+    def test_stale_suggestion_index_is_rebuilt_off_the_event_loop(self):
+        # with MAX_AGE 0 the index is stale again right after every rebuild, the lookup mustn't reload it
+        for _ in range(2):
+            response = self.call_async(async_views.search_suggestions, self.factory.get('/api/search/suggestion/', {'query': 'game'}))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(json.loads(response.content)['data']), 6)
+
+    def test_cached_with_etag(self):
+        first = self.call_async(async_views.all_games, self.factory.get('/api/games/all/'))
+        request = self.factory.get('/api/games/all/', HTTP_IF_NONE_MATCH=first['ETag'])
+        with self.assertNumQueries(0):
+            response = self.call_async(async_views.all_games, request)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['Vary'], 'Authorization, Cookie')
+
+    def test_credentials_go_to_the_sync_view(self):
+        user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        OwnedGame.objects.create(user=user, game=self.games[0])
+        token = Token.objects.create(user=user)
+        request = self.factory.get('/api/games/all/', {'hide_owned': 'true'}, HTTP_AUTHORIZATION=f'Token {token.key}')
+        response = self.call_async(async_views.all_games, request)
+        game_ids = [game['id'] for game in json.loads(response.content)['data']['games']]
+        self.assertNotIn(self.games[0].id, game_ids)
+        self.assertEqual(len(game_ids), 5)
+
+
+class FastJSONRendererTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client.force_authenticate(self.user)
+        self.games = create_games(3)
+
+    def payload(self):
+        return {
+            'price': Decimal('59.99'),
+            'date': date(2024, 1, 1),
+            'datetime': datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+            'error': ErrorDetail('Invalid.', code='invalid'),
+            'text': 'line\u2028separator é',
+            'games': GameSerializer(Game.objects.with_catalog_data(), many=True).data,
+            1: None,
+        }
+
+    def test_matches_drf_output(self):
+        data = self.payload()
+        self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # and again with every game served from the fragment cache
+        data = self.payload()
+        self.assertIsInstance(data['games'][0], renderers.JSONFragment)
+        self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_datetimes_match_drf_output(self):
+        data = {
+            'utc': datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+            'offset': datetime(2024, 1, 1, 12, 30, 15, 500, tzinfo=timezone(timedelta(hours=13))),
+            'naive': datetime(2024, 1, 1, 12, 30),
+            'date': date(2024, 2, 29),
+            'time': datetime(2024, 1, 1, 9, 5, 1, 250000).time(),
+            'created': Game.objects.values_list('created_at', flat=True)[0],
+        }
+        self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_games_are_rendered_once(self):
+        self.client.get(reverse('api:all_games'))
+        self.assertEqual(len(game_fragments), 3)
+        with mock.patch('rest_framework.serializers.ModelSerializer.to_representation') as to_representation:
+            response = self.client.get(reverse('api:all_games'))
+        to_representation.assert_not_called()
+        self.assertEqual(len(response.data['data']['games']), 3)
+
+    def test_changes_are_picked_up(self):
+        self.client.get(reverse('api:all_games'), {'fields': 'title'})
+        self.games[0].title = 'Renamed'
+        self.games[0].save()
+        response = self.client.get(reverse('api:all_games'), {'fields': 'title'})
+        self.assertIn({'id': self.games[0].id, 'title': 'Renamed'}, response.json()['data']['games'])
+
+        Platform.objects.get(name='PS5').delete()
+        response = self.client.get(reverse('api:all_games'))
+        self.assertEqual([platform['name'] for platform in response.json()['data']['games'][0]['platforms']], ['PC'])
+
+    def test_callers_get_their_own_copy(self):
+        games = Game.objects.with_catalog_data()
+        data = GameSerializer(games, many=True).data
+        title = data[0]['title']
+        data[0]['title'] = 'Changed'
+        data[0]['platforms'].clear()
+        again = GameSerializer(games, many=True).data
+        self.assertIsInstance(again[0], renderers.JSONFragment)
+        self.assertEqual(again[0]['title'], title)
+        self.assertEqual(len(again[0]['platforms']), 2)
+        self.assertEqual(json.loads(again[0].content), again[0])
+
+    def test_bulk_updates_are_picked_up_after_a_rebuild(self):
+        self.client.get(reverse('api:all_games'), {'fields': 'title'})
+        # skips updated_at and the signals
+        Game.objects.filter(pk=self.games[0].pk).update(title='Renamed')
+        call_command('rebuild_search_index', stdout=StringIO())
+        with mock.patch('api.fragments.time.monotonic', return_value=time.monotonic() + 60):
+            response = self.client.get(reverse('api:all_games'), {'fields': 'title'})
+        self.assertIn({'id': self.games[0].id, 'title': 'Renamed'}, response.json()['data']['games'])
+
+    @override_settings(GAME_FRAGMENT_CACHE_SIZE=0)
+    def test_can_be_turned_off(self):
+        self.client.get(reverse('api:all_games'))
+        self.assertEqual(len(game_fragments), 0)
@@ -1,17 +1,34 @@
+from django.conf import settings
 from django.urls import path
 from .api import *
+from . import async_views
+
+# the read-only catalog endpoints have async versions for ASGI deployments (see api.async_views)
+if settings.ASYNC_CATALOG_VIEWS:
+    all_games_view = async_views.all_games
+    specific_game_view = async_views.specific_game
+    search_suggestions_view = async_views.search_suggestions
+else:
+    all_games_view = AllGameInfo.as_view()
+    specific_game_view = SpecificGameInfo.as_view()
+    search_suggestions_view = SearchSuggestions.as_view()
 
 app_name = 'api'
 
 urlpatterns = [
     path('user/', UserView.as_view(), name='user'),
     path('user/create/', UserSignUp.as_view(), name='user_signup'),
-    path('games/all/', AllGameInfo.as_view(), name='all_games'), 
-    path('games/specific/', SpecificGameInfo.as_view(), name='specific_game'),
+    path('user/logout/', UserLogout.as_view(), name='user_logout'),
+    path('games/all/', all_games_view, name='all_games'), 
+    path('games/specific/', specific_game_view, name='specific_game'),
+    path('games/bulk/', BulkGameInfo.as_view(), name='bulk_games'),
+    path('games/<int:game_id>/', GameDetail.as_view(), name='game_detail'),
     path('games/owned/', OwnedGamesView.as_view(), name='owned_games'),
     path('cart/edit/', EditGameCart.as_view(), name='add_game_to_cart'),
+    path('cart/batch/', BatchEditCart.as_view(), name='batch_edit_cart'),
     path('cart/view/', ViewCart.as_view(), name='view_cart'),
-    path('search/suggestion/', SearchSuggestions.as_view(), name='search_suggestions'),
+    path('search/suggestion/', search_suggestions_view, name='search_suggestions'),
     path('order/create/', CreateOrder.as_view(), name='create_order'),
     path('order/', OrderInfoView.as_view(), name='order_info'),
+    path('order/history/', OrderHistoryView.as_view(), name='order_history'),
 ]
\ No newline at end of file
@@ -11,8 +11,8 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 from pathlib import Path
-from cryptography.fernet import Fernet
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 import os
 
 env_path = Path(__file__).resolve().parent.parent / '.env'
@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.HashingBusyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_browser_reload.middleware.BrowserReloadMiddleware',
@@ -86,9 +87,10 @@ TEMPLATES = [
     },
 ]
 
+# UsernameOrEmailBackend extends ModelBackend (permissions included), a second backend
+# would only check the password of a failed login again
 AUTHENTICATION_BACKENDS = [
     'users.backends.UsernameOrEmailBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
@@ -108,6 +110,28 @@ DATABASES = {
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
+# Password hashing (see users.hashers). PASSWORD_HASHER picks the hasher new passwords use, the
+# others stay listed so existing hashes still verify and get upgraded on login.
+# argon2 needs the optional argon2-cffi package
+PASSWORD_HASHER_CHOICES = {
+    'pbkdf2': 'users.hashers.TunablePBKDF2PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+}
+PASSWORD_HASHER = os.getenv('PASSWORD_HASHER', 'pbkdf2')
+if PASSWORD_HASHER not in PASSWORD_HASHER_CHOICES:
+    raise ImproperlyConfigured(
+        f"PASSWORD_HASHER must be one of {', '.join(PASSWORD_HASHER_CHOICES)}, not {PASSWORD_HASHER!r}."
+    )
+PASSWORD_HASHERS = [PASSWORD_HASHER_CHOICES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CHOICES.items() if name != PASSWORD_HASHER
+]
+PASSWORD_HASHING = {
+    'PBKDF2_ITERATIONS': int(os.getenv('PBKDF2_ITERATIONS')) if os.getenv('PBKDF2_ITERATIONS') else None,
+    'MAX_CONCURRENT': int(os.getenv('PASSWORD_HASHING_MAX_CONCURRENT', 2)),
+    'TIMEOUT': float(os.getenv('PASSWORD_HASHING_TIMEOUT', 5)),
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -154,6 +178,28 @@ STATICFILES_FINDERS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Cache
+# locmem is per process, point CACHE_BACKEND/CACHE_LOCATION at a shared cache (e.g. redis) when running several workers.
+# a per-process catalog cache only hears about catalog writes made in its own worker, so by default its
+# responses expire after 10 seconds. a shared one sees every write and keeps them for an hour
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+CATALOG_CACHE_BACKEND = os.getenv('CATALOG_CACHE_BACKEND', LOCMEM_CACHE)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', LOCMEM_CACHE),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'default'),
+    },
+    # anonymous catalog responses, keyed on the catalog version so any game write invalidates them
+    'catalog': {
+        'BACKEND': CATALOG_CACHE_BACKEND,
+        'LOCATION': os.getenv('CATALOG_CACHE_LOCATION', 'catalog'),
+        'TIMEOUT': int(os.getenv('CATALOG_CACHE_TIMEOUT', 60 * 60 if CATALOG_CACHE_BACKEND != LOCMEM_CACHE else 10)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CATALOG_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -188,20 +234,69 @@ LOGGING = {
 # Rest Framework Config
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated', 
     ],
+    # orjson backed, see api.renderers
     'DEFAULT_RENDERER_CLASSES': (
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.FastJSONRenderer',
     ) if not DEBUG else (
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.FastJSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
+    # adds the 503 for busy password hashing, see users.hashers
+    'EXCEPTION_HANDLER': 'api.exceptions.exception_handler',
+}
+
+# Game detail pages (/api/games/<id>/) can be cached by browsers, CDNs and proxies for this long (seconds)
+GAME_DETAIL_CACHE_MAX_AGE = int(os.getenv('GAME_DETAIL_CACHE_MAX_AGE', 60))
+
+# Order ids: every worker leases its own node id (0-1023) from the database for this long (seconds),
+# renewing it halfway through. a worker that goes away frees its node id once the lease runs out
+ORDER_ID_NODE_LEASE = int(os.getenv('ORDER_ID_NODE_LEASE', 600))
+
+# Serve the read-only catalog endpoints from async views (api.async_views), meant for ASGI deployments
+ASYNC_CATALOG_VIEWS = os.getenv('ASYNC_CATALOG_VIEWS', 'False').lower() == 'true'
+
+# Pre-rendered games kept per worker (api.fragments), 0 turns it off
+GAME_FRAGMENT_CACHE_SIZE = int(os.getenv('GAME_FRAGMENT_CACHE_SIZE', 5000))
+
+# Platform/genre/sale filters (in-memory facet index, one per worker). it follows catalog writes through
+# the catalog cache, and is rebuilt after this many seconds for writes it can't see (per-process caches)
+FACET_INDEX_MAX_AGE = int(os.getenv('FACET_INDEX_MAX_AGE', 60))
+
+# Search suggestions (in-memory title index, one per worker)
+SEARCH_SUGGESTIONS = {
+    'MEMORY_BUDGET': int(os.getenv('SEARCH_SUGGESTIONS_MEMORY_BUDGET', 8 * 1024 * 1024)),
+    'MAX_PREFIX_LENGTH': 12,
+    'MAX_AGE': int(os.getenv('SEARCH_SUGGESTIONS_MAX_AGE', 300)),
+}
+
+# Token authentication (see users.authentication)
+AUTH_TOKEN = {
+    'TTL': int(os.getenv('AUTH_TOKEN_CACHE_TTL', 60)),
+    'MAX_SIZE': int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000)),
+    'EXPIRY': int(os.getenv('AUTH_TOKEN_EXPIRY')) if os.getenv('AUTH_TOKEN_EXPIRY') else None,
+    'CACHE': os.getenv('AUTH_TOKEN_VERSION_CACHE', 'default'),
+}
+
+# Background tasks (in-process thread pool, see api.tasks)
+TASK_RUNNER = {
+    'MAX_WORKERS': int(os.getenv('TASK_RUNNER_MAX_WORKERS', 2)),
+    'MAX_RETRIES': int(os.getenv('TASK_RUNNER_MAX_RETRIES', 3)),
+    'RETRY_BACKOFF': float(os.getenv('TASK_RUNNER_RETRY_BACKOFF', 0.5)),
+    'EAGER': os.getenv('TASK_RUNNER_EAGER', 'False').lower() == 'true',
 }
 
-# Encryption Key
-ENCRYPTION_KEY = Fernet.generate_key() if not os.getenv('ENCRYPTION_KEY') else os.getenv('ENCRYPTION_KEY')
\ No newline at end of file
+# Encryption Keys (card numbers, see users.crypto)
+# ENCRYPTION_KEYS is a comma separated keyring of id:key pairs, newest first, the first one encrypts.
+# ENCRYPTION_KEYRING_FILE can point at a JSON keyring instead: {"primary": "<id>", "keys": {"<id>": "<key>"}}.
+# a lone ENCRYPTION_KEY still works. there's no generated fallback: every worker has to share the same
+# keys, so the users app refuses to start without one
+ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')
+ENCRYPTION_KEYS = os.getenv('ENCRYPTION_KEYS', '')
+ENCRYPTION_KEYRING_FILE = os.getenv('ENCRYPTION_KEYRING_FILE')
\ No newline at end of file
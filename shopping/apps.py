@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ShoppingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shopping'
+
+    def ready(self):
+        # connects the Game signals that keep the search index in sync
+        from . import signals
@@ -0,0 +1,74 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, DecimalField, Exists, ExpressionWrapper, F, OuterRef, Sum
+
+from .models import CartItem, Game, OwnedGame, effective_price
+
+# per-user cart totals, computed with one aggregate query and cached until the cart or a game in it changes
+CART_TOTALS_TIMEOUT = 60 * 60
+
+def _cache_key(user_id):
+    return f'cart_totals:{user_id}'
+
+def calculate_cart_totals(user_id):
+    line_total = ExpressionWrapper(
+        effective_price('game__') * F('quantity'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    totals = CartItem.objects.filter(user_id=user_id).aggregate(
+        item_count=Count('id'),
+        subtotal=Sum(line_total, output_field=DecimalField(max_digits=12, decimal_places=2)),
+    )
+    return {
+        'item_count': totals['item_count'],
+        'subtotal': totals['subtotal'] or Decimal('0.00'),
+    }
+
+def get_cart_totals(user):
+    key = _cache_key(user.id)
+    totals = cache.get(key)
+    if totals is None:
+        totals = calculate_cart_totals(user.id)
+        cache.set(key, totals, CART_TOTALS_TIMEOUT)
+    return totals
+
+def invalidate_cart_totals(user_ids):
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
+
+class CartError(Exception):
+    pass
+
+def update_cart(user, add_ids=(), remove_ids=()):
+    # adds and removes a batch of games with a fixed number of queries, whatever the batch size.
+    # games already in the cart are skipped and removing a game that isn't there is a no-op,
+    # so a retried batch gives the same cart
+    add_ids, remove_ids = set(add_ids), set(remove_ids)
+
+    if add_ids:
+        # existence and ownership of every added game in one query
+        owned = dict(
+            Game.objects.filter(id__in=add_ids).annotate(
+                is_owned=Exists(OwnedGame.objects.filter(user=user, game=OuterRef('pk')))
+            ).values_list('id', 'is_owned')
+        )
+        missing = add_ids - set(owned)
+        if missing:
+            raise CartError(f'Games not found: {", ".join(map(str, sorted(missing)))}')
+        already_owned = [game_id for game_id, is_owned in owned.items() if is_owned]
+        if already_owned:
+            raise CartError(f'Games already owned: {", ".join(map(str, sorted(already_owned)))}')
+
+    with transaction.atomic():
+        if add_ids:
+            CartItem.objects.bulk_create(
+                [CartItem(user=user, game_id=game_id) for game_id in add_ids],
+                ignore_conflicts=True,
+            )
+        if remove_ids:
+            CartItem.objects.filter(user=user, game_id__in=remove_ids).delete()
+
+    # bulk_create doesn't send post_save, so the cached totals are cleared here
+    invalidate_cart_totals([user.id])
+    transaction.on_commit(lambda: invalidate_cart_totals([user.id]))
@@ -0,0 +1,91 @@
+import hashlib
+import json
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+
+from users.models import User
+from .models import Game, OwnedGame, CartItem, Order, OrderItem, effective_price
+from .order_ids import order_id_generator
+
+# atomic checkout: validation, pricing and every write happen in one transaction, with the buyer's
+# row locked so concurrent double-submits queue up instead of racing the ownership check
+
+class CheckoutError(Exception):
+    pass
+
+class IdempotencyKeyReused(CheckoutError):
+    pass
+
+def get_request_hash(game_ids):
+    return hashlib.sha256(json.dumps(sorted(game_ids)).encode()).hexdigest()
+
+def get_existing_order(user, idempotency_key, request_hash):
+    if not idempotency_key:
+        return None
+    order = Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+    # orders from before the hash was stored can't be compared, those are taken as a match
+    if order and order.idempotency_hash and order.idempotency_hash != request_hash:
+        raise IdempotencyKeyReused('This idempotency key was already used for a different order.')
+    return order
+
+def place_order(user, game_ids, idempotency_key=None):
+    # returns (order, created). a retry with an idempotency key that was already used returns the original order
+    request_hash = get_request_hash(game_ids)
+    existing = get_existing_order(user, idempotency_key, request_hash)
+    if existing:
+        return existing, False
+
+    for attempt in range(2):
+        # the id is picked before the transaction, so leasing a node id for it (shopping.order_ids) commits on its own
+        order_id = order_id_generator.next_id()
+        try:
+            return _place_order(user, game_ids, idempotency_key, request_hash, order_id), True
+        except IntegrityError:
+            # a concurrent request with the same key got there first
+            existing = get_existing_order(user, idempotency_key, request_hash)
+            if existing:
+                return existing, False
+            if attempt == 0 and Order.objects.filter(id=order_id).exists():
+                # the id was already taken, which takes two workers holding the same node id. try once more
+                continue
+            raise
+
+def _place_order(user, game_ids, idempotency_key, request_hash, order_id):
+    with transaction.atomic():
+        # select_for_update is a no-op on sqlite, which already serializes writers
+        list(User.objects.select_for_update().filter(id=user.id).values_list('id', flat=True))
+
+        # existence, ownership and price in a single query
+        games = list(
+            Game.objects.filter(id__in=game_ids).annotate(
+                is_owned=Exists(OwnedGame.objects.filter(user=user, game=OuterRef('pk'))),
+                purchase_price=effective_price(),
+            )
+        )
+        if len(games) != len(game_ids):
+            raise CheckoutError('One or more games not found.')
+
+        owned_titles = [game.title for game in games if game.is_owned]
+        if owned_titles:
+            raise CheckoutError(f'You already own the following games: {", ".join(owned_titles)}')
+
+        order = Order.objects.create(
+            id=order_id,
+            user=user,
+            total_amount=sum(game.purchase_price for game in games),
+            is_completed=True,
+            idempotency_key=idempotency_key or None,
+            idempotency_hash=request_hash if idempotency_key else '',
+        )
+
+        order_items = []
+        for game in games:
+            order_item = OrderItem(order=order, game=game, purchase_price=game.purchase_price, quantity=1)
+            order_item.snapshot_game()
+            order_items.append(order_item)
+        OrderItem.objects.bulk_create(order_items)
+        OwnedGame.objects.bulk_create([OwnedGame(user=user, game=game) for game in games])
+
+        CartItem.objects.filter(user=user, game__in=games).delete()
+    return order
@@ -0,0 +1,96 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .versioning import get_catalog_version
+
+# in-memory facet index: which game ids are on each platform, in each genre and on sale.
+# filtering becomes a set intersection instead of joins through the m2m tables, and facet counts
+# fall out of the same sets. the index is tagged with the catalog version it was built from and
+# rebuilds (three queries) on the first lookup after any catalog write. the version only reaches other
+# workers through a shared CACHES['catalog'] (locmem is per process), so the index is also rebuilt once
+# it's FACET_INDEX_MAX_AGE seconds old
+class FacetIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._version = None
+            self._built_at = None
+            self._all = frozenset()
+            self._on_sale = frozenset()
+            self._platforms = {}
+            self._genres = {}
+
+    def rebuild(self, version):
+        from .models import Game
+
+        all_ids, on_sale = set(), set()
+        for game_id, is_sale in Game.objects.values_list('id', 'is_sale'):
+            all_ids.add(game_id)
+            if is_sale:
+                on_sale.add(game_id)
+
+        platforms, genres = {}, {}
+        for game_id, name in Game.platforms.through.objects.values_list('game_id', 'platform__name'):
+            platforms.setdefault(name, set()).add(game_id)
+        for game_id, name in Game.genres.through.objects.values_list('game_id', 'genre__name'):
+            genres.setdefault(name, set()).add(game_id)
+
+        with self._lock:
+            self._all = frozenset(all_ids)
+            self._on_sale = frozenset(on_sale)
+            self._platforms = {name: frozenset(ids) for name, ids in platforms.items()}
+            self._genres = {name: frozenset(ids) for name, ids in genres.items()}
+            self._version = version
+            self._built_at = time.monotonic()
+
+    def _ensure_current(self):
+        version = get_catalog_version()
+        if not self._is_stale(version):
+            return
+        with self._rebuild_lock:
+            if self._is_stale(version):
+                self.rebuild(version)
+
+    def _is_stale(self, version):
+        built_at = self._built_at
+        if version != self._version or built_at is None:
+            return True
+        return time.monotonic() - built_at > getattr(settings, 'FACET_INDEX_MAX_AGE', 60)
+
+    def match(self, platform=None, genre=None, on_sale=False):
+        # ids of the games passing every given facet, None when no facet was given
+        if platform is None and genre is None and not on_sale:
+            return None
+        self._ensure_current()
+        with self._lock:
+            sets = []
+            if platform is not None:
+                sets.append(self._platforms.get(platform, frozenset()))
+            if genre is not None:
+                sets.append(self._genres.get(genre, frozenset()))
+            if on_sale:
+                sets.append(self._on_sale)
+        sets.sort(key=len)
+        return frozenset.intersection(*sets)
+
+    def counts(self, game_ids=None):
+        # how many of game_ids (default: every game) fall under each facet, zero counts are left out
+        self._ensure_current()
+        with self._lock:
+            game_ids = self._all if game_ids is None else game_ids
+            platforms = {name: len(ids & game_ids) for name, ids in self._platforms.items()}
+            genres = {name: len(ids & game_ids) for name, ids in self._genres.items()}
+            on_sale = len(self._on_sale & game_ids)
+        return {
+            'platforms': {name: count for name, count in sorted(platforms.items()) if count},
+            'genres': {name: count for name, count in sorted(genres.items()) if count},
+            'on_sale': on_sale,
+        }
+
+facet_index = FacetIndex()
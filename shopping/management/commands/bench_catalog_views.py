@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import async_to_sync
+import asyncio
+import time
+
+from api import async_views
+from api.api import AllGameInfo, SpecificGameInfo, SearchSuggestions
+from shopping.models import Game
+
+class Command(BaseCommand):
+    help = (
+        'Load benchmark of the catalog endpoints: the DRF views on a thread pool (WSGI style) '
+        'against the async views on one event loop (ASGI style)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests per endpoint and mode')
+        parser.add_argument('--threads', type=int, default=8, help='Worker threads for the WSGI mode')
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight for the ASGI mode')
+        parser.add_argument('--uncached', action='store_true', help='Bypass the catalog response cache')
+
+    def handle(self, *args, **options):
+        game_id = Game.objects.values_list('id', flat=True).first()
+        if game_id is None:
+            self.stderr.write('No games in the database, add some first (manage.py create_games).')
+            return
+
+        factory = RequestFactory()
+        endpoints = {
+            'games/all': (
+                AllGameInfo.as_view(), async_views.all_games,
+                lambda: factory.get('/api/games/all/', {'page_size': 20}),
+            ),
+            'games/specific': (
+                SpecificGameInfo.as_view(), async_views.specific_game,
+                lambda: factory.post('/api/games/specific/', {'game_id': game_id}, content_type='application/json'),
+            ),
+            'search/suggestion': (
+                SearchSuggestions.as_view(), async_views.search_suggestions,
+                lambda: factory.get('/api/search/suggestion/', {'query': 'the'}),
+            ),
+        }
+
+        caches = settings.CACHES
+        if options['uncached']:
+            caches = {**caches, 'catalog': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(CACHES=caches):
+            for name, (sync_view, async_view, build_request) in endpoints.items():
+                requests = [build_request() for _ in range(options['requests'])]
+                wsgi = self.run_wsgi(sync_view, requests, options['threads'])
+                asgi = async_to_sync(self.run_asgi)(async_view, requests, options['concurrency'])
+                self.stdout.write(
+                    f'{name:>18}: wsgi {len(requests) / wsgi:,.0f} req/sec ({options["threads"]} threads), '
+                    f'asgi {len(requests) / asgi:,.0f} req/sec ({options["concurrency"]} in flight)'
+                )
+
+    def run_wsgi(self, view, requests, threads):
+        def call(request):
+            try:
+                view(request).render()
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(call, requests))
+        return time.perf_counter() - start
+
+    async def run_asgi(self, view, requests, concurrency):
+        slots = asyncio.Semaphore(concurrency)
+
+        async def call(request):
+            async with slots:
+                await view(request)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(call(request) for request in requests))
+        return time.perf_counter() - start
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+import time
+
+from api.fragments import game_fragments
+from api.renderers import FastJSONRenderer
+from api.serializers import GameSerializer
+from shopping.models import Game
+
+class Command(BaseCommand):
+    help = 'Benchmark serializing and rendering a page of games: DRF JSONRenderer vs FastJSONRenderer with cached fragments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--games', type=int, default=50, help='Games per page')
+        parser.add_argument('--runs', type=int, default=200, help='Pages to render per mode')
+
+    def handle(self, *args, **options):
+        games = list(Game.objects.with_catalog_data()[:options['games']])
+        if not games:
+            self.stderr.write('No games in the database, add some first (manage.py create_games).')
+            return
+
+        with override_settings(GAME_FRAGMENT_CACHE_SIZE=0):
+            baseline = self.run(games, JSONRenderer(), options['runs'])
+        game_fragments.clear()
+        fast = self.run(games, FastJSONRenderer(), options['runs'])
+
+        for name, elapsed in (('JSONRenderer', baseline), ('FastJSONRenderer', fast)):
+            per_page = elapsed / options['runs'] * 1000
+            self.stdout.write(f'{name:>16}: {per_page:.2f}ms per page of {len(games)} games')
+        self.stdout.write(f'{baseline / fast:.1f}x faster')
+
+    def run(self, games, renderer, runs):
+        # one warm-up page (fills the fragment cache when it's on), then the timed ones
+        renderer.render({'games': GameSerializer(games, many=True).data})
+        start = time.perf_counter()
+        for _ in range(runs):
+            renderer.render({'games': GameSerializer(games, many=True).data})
+        return time.perf_counter() - start
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from shopping.models import Order
+from shopping.order_ids import order_id_generator
+from users.models import User
+from decimal import Decimal
+import random
+import string
+import time
+
+def random_order_id():
+    # the old generator, kept here for comparison
+    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Benchmark Order insert throughput with random vs time-ordered ids (everything is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=5000, help='Orders to insert per run')
+        parser.add_argument('--runs', type=int, default=3, help='Runs per generator, the best one is reported')
+
+    def handle(self, *args, **kwargs):
+        generators = {
+            'random (legacy)': random_order_id,
+            'time-ordered': order_id_generator.next_id,
+        }
+        # lease a node id up front, a lease taken inside the rolled back runs would be checked on every id
+        order_id_generator.next_id()
+        for name, generate in generators.items():
+            best = min(self.run(generate, kwargs['orders']) for _ in range(kwargs['runs']))
+            rate = kwargs['orders'] / best
+            self.stdout.write(f'{name:>16}: {rate:,.0f} orders/sec ({best:.3f}s for {kwargs["orders"]} inserts)')
+
+    def run(self, generate, count):
+        try:
+            with transaction.atomic():
+                user = User.objects.create_user(username='bench_order_ids', email='bench_order_ids@example.com')
+                start = time.perf_counter()
+                for _ in range(count):
+                    Order.objects.create(id=generate(), user=user, total_amount=Decimal('0.00'), is_completed=True)
+                elapsed = time.perf_counter() - start
+                raise Rollback()
+        except Rollback:
+            return elapsed
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from shopping import search
+from shopping.versioning import bump_catalog_version
+
+class Command(BaseCommand):
+    help = 'Rebuild the game full-text search index (needed after bulk updates that skip signals)'
+
+    def handle(self, *args, **kwargs):
+        search.rebuild_index()
+        # the bulk update skipped the catalog signals too, so cached responses and rendered games
+        # (api.fragments) are dropped in every worker sharing the catalog cache
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:09
+
+from django.db import migrations, models
+
+
+def snapshot_existing_items(apps, schema_editor):
+    OrderItem = apps.get_model('shopping', 'OrderItem')
+    items = list(OrderItem.objects.select_related('game'))
+    for item in items:
+        item.game_title = item.game.title
+        item.game_image = item.game.image.name
+    OrderItem.objects.bulk_update(items, ['game_title', 'game_image'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0008_game_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='game_image',
+            field=models.ImageField(blank=True, upload_to='games/'),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='game_title',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(snapshot_existing_items, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:11
+
+import shopping.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0010_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='id',
+            field=models.CharField(default=shopping.models.generate_order_id, editable=False, max_length=16, primary_key=True, serialize=False, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shopping', '0012_order_id_node'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='idempotency_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
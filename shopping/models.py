@@ -1,8 +1,7 @@
 from django.db import models
 from users.models import User
 from django.conf import settings
-import string
-import random
+from .order_ids import unleased_order_id
 
 # Create your models here.
 PLATFORM_CHOICES = [
@@ -51,6 +50,55 @@ class Genre(models.Model):
     def __str__(self):
         return self.get_name_display()
 
+def effective_price(prefix=''):
+    # the price a game actually sells for: the sale price while it's on sale (and set), otherwise the full price
+    # (prefix lets it run across a relation, e.g. 'game__')
+    return models.Case(
+        models.When(
+            **{f'{prefix}is_sale': True, f'{prefix}sale_price__gt': 0},
+            then=models.F(f'{prefix}sale_price'),
+        ),
+        default=models.F(f'{prefix}price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+class GameQuerySet(models.QuerySet):
+    def with_catalog_data(self, fields=None):
+        # prefetches the m2m data GameSerializer needs, so a listing costs a fixed number of queries
+        # fields (a sparse fieldset) skips the prefetches and columns the response won't use
+        if fields is None:
+            return self.prefetch_related('platforms', 'genres')
+        related = [name for name in ('platforms', 'genres') if name in fields]
+        columns = [name for name in fields if name not in ('platforms', 'genres')]
+        # updated_at keys the rendered game cache (api.fragments)
+        return self.prefetch_related(*related).only(*columns, 'updated_at')
+
+class GameRelatedQuerySet(models.QuerySet):
+    # shared by the models that point at a game and get serialized with a nested GameSerializer
+    def with_game(self):
+        return self.select_related('game').prefetch_related('game__platforms', 'game__genres')
+
+class CartItemQuerySet(GameRelatedQuerySet):
+    def summaries(self):
+        # {'id', 'game_id'} dicts straight from the cart table, no game rows loaded
+        return self.order_by('id').values('id', 'game_id')
+
+class OrderQuerySet(models.QuerySet):
+    def with_items(self):
+        return self.prefetch_related(
+            models.Prefetch('order_items', queryset=OrderItem.objects.with_game())
+        )
+
+    def with_item_snapshots(self):
+        # the items' own title/image snapshots are enough, the games aren't loaded at all
+        return self.prefetch_related('order_items')
+
+def build_image_url(image):
+    if settings.DEBUG:
+        return f"http://localhost:8070{image.url}"
+    else:
+        return f"https://lawrencestudios.com{image.url}"
+
 class Game(models.Model):
     title = models.CharField(max_length=255)
     developer = models.CharField(max_length=255)
@@ -76,6 +124,8 @@ class Game(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = GameQuerySet.as_manager()
+
     class Meta:
         ordering = ['-release_date']
         verbose_name_plural = 'Games'
@@ -84,16 +134,15 @@ class Game(models.Model):
         return self.title
     
     def return_image_url(self):
-        if settings.DEBUG:
-            return f"http://localhost:8070{self.image.url}"
-        else:
-            return f"https://lawrencestudios.com{self.image.url}"
+        return build_image_url(self.image)
     
 class OwnedGame(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_games')
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='owners')
     purchase_date = models.DateField(auto_now_add=True)
 
+    objects = GameRelatedQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'game')
 
@@ -106,17 +155,31 @@ class CartItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     added_date = models.DateField(auto_now_add=True)
 
+    objects = CartItemQuerySet.as_manager()
+
     class Meta:
         unique_together = ('user', 'game')
 
     def get_game_id(self):
-        return self.game.id if self.game else None
+        # the foreign key value, reading self.game.id would load the whole game
+        return self.game_id
 
     def __str__(self):
         return f"{self.user.username} has {self.quantity} of {self.game.title} in cart"
     
+class OrderIdNode(models.Model):
+    """A node id leased by one worker process for generating order ids (see shopping.order_ids)"""
+    node_id = models.PositiveSmallIntegerField(primary_key=True)
+    owner = models.CharField(max_length=100)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Order id node {self.node_id} held by {self.owner} until {self.expires_at}"
+
 def generate_order_id():
-    return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+    # time ordered, without touching the database. checkout assigns ids from the leased, collision free
+    # generator instead, see shopping.order_ids (orders from before it keep their 8 character ids)
+    return unleased_order_id()
 
 class OrderItem(models.Model):
     """Represents an individual game purchase within an order"""
@@ -124,6 +187,11 @@ class OrderItem(models.Model):
     game = models.ForeignKey(Game, on_delete=models.CASCADE, related_name='order_items')
     purchase_price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField(default=1)
+    # what the game looked like when it was bought, so order history doesn't need the live game
+    game_title = models.CharField(max_length=255, blank=True)
+    game_image = models.ImageField(upload_to='games/', blank=True)
+
+    objects = GameRelatedQuerySet.as_manager()
     
     class Meta:
         unique_together = ('order', 'game')
@@ -131,10 +199,17 @@ class OrderItem(models.Model):
     def __str__(self):
         return f"{self.game.title} in Order {self.order.id} - ${self.purchase_price}"
 
+    def snapshot_game(self):
+        self.game_title = self.game.title
+        self.game_image = self.game.image.name
+
+    def return_image_url(self):
+        return build_image_url(self.game_image) if self.game_image else None
+
 class Order(models.Model):
     id = models.CharField(
         primary_key=True,
-        max_length=8,
+        max_length=16,
         unique=True,
         editable=False,
         default=generate_order_id
@@ -144,6 +219,17 @@ class Order(models.Model):
     order_date = models.DateField(auto_now_add=True)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     is_completed = models.BooleanField(default=False)
+    # client supplied key that makes a retried checkout return the original order
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+    # hash of what the key was first used for, a reused key with a different request is refused
+    idempotency_hash = models.CharField(max_length=64, blank=True)
+
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_order_idempotency_key'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.user.username} on {self.order_date} - Total: ${self.total_amount:.2f}"
\ No newline at end of file
@@ -0,0 +1,160 @@
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+
+# snowflake style order ids: 42 bits of milliseconds since ORDER_ID_EPOCH_MS, 10 bits of node id and
+# a 12 bit per-millisecond sequence, written as 13 characters of Crockford base32.
+# they sort by creation time (so inserts land at the end of the primary key index instead of all
+# over it) and can't collide because every process leases its own node id from the database
+# (OrderIdNode). a lease lasts ORDER_ID_NODE_LEASE seconds by the database's clock and is renewed
+# halfway through, so the node ids of workers that went away are free again once their lease runs out.
+# leasing takes queries, so only checkout (shopping.checkout) uses order_id_generator. the Order model's
+# default (unleased_order_id) is a plain function for the odd order made anywhere else
+ORDER_ID_EPOCH_MS = 1735689600000  # 2025-01-01 UTC
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE_ID = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+ID_LENGTH = 13
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+def encode(value):
+    chars = []
+    for _ in range(ID_LENGTH):
+        value, remainder = divmod(value, 32)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+def decode(order_id):
+    value = 0
+    for char in order_id:
+        value = value * 32 + ALPHABET.index(char)
+    return value
+
+def unleased_order_id():
+    # time ordered like the leased ids, with random bits in place of the node id and sequence. fine for
+    # admin/shell/fixture orders, which don't come fast enough for a clash in the same millisecond
+    now = int(time.time() * 1000)
+    return encode(((now - ORDER_ID_EPOCH_MS) << (NODE_BITS + SEQUENCE_BITS)) | random.getrandbits(NODE_BITS + SEQUENCE_BITS))
+
+def get_lease_duration():
+    return timedelta(seconds=getattr(settings, 'ORDER_ID_NODE_LEASE', 600))
+
+def database_now():
+    # leases are timed by the database's clock, so workers on hosts whose clocks disagree still agree on them
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT CURRENT_TIMESTAMP')
+        now = cursor.fetchone()[0]
+    if isinstance(now, str):
+        # sqlite gives back text, in utc
+        now = datetime.fromisoformat(now)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+    return now
+
+def lease_node_id(owner, current=None):
+    # renews current if owner still holds it, otherwise takes a node id nobody holds (or whose lease ran out).
+    # returns (node id, lease expiry)
+    from .models import OrderIdNode
+
+    now = database_now()
+    expires_at = now + get_lease_duration()
+    if current is not None and OrderIdNode.objects.filter(node_id=current, owner=owner).update(expires_at=expires_at):
+        return current, expires_at
+
+    held = set(OrderIdNode.objects.filter(expires_at__gt=now).values_list('node_id', flat=True))
+    free = [node_id for node_id in range(MAX_NODE_ID + 1) if node_id not in held]
+    # random order, so workers starting together don't all race for the same one
+    random.shuffle(free)
+    for node_id in free:
+        # an expired lease is taken over in place, only one worker's update can match it
+        if OrderIdNode.objects.filter(node_id=node_id, expires_at__lte=now).update(owner=owner, expires_at=expires_at):
+            return node_id, expires_at
+        try:
+            with transaction.atomic():
+                OrderIdNode.objects.create(node_id=node_id, owner=owner, expires_at=expires_at)
+            return node_id, expires_at
+        except IntegrityError:
+            # another worker got there first
+            continue
+    raise RuntimeError(f'All {MAX_NODE_ID + 1} order id nodes are leased.')
+
+class OrderIdGenerator:
+    def __init__(self, node_id=None):
+        # node_id pins the node (for tests and one-off scripts), otherwise one is leased on first use.
+        # next_id can query the database to take or renew the lease, call it before opening a transaction
+        if node_id is not None and not 0 <= node_id <= MAX_NODE_ID:
+            raise ValueError(f'node_id must be between 0 and {MAX_NODE_ID}.')
+        self._lock = threading.Lock()
+        self._fixed_node_id = node_id
+        self._pid = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._owner = f'{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}'
+        self._node_id = self._fixed_node_id
+        self._expires_at = None
+        self._renew_at = None
+        self._lease_committed = False
+        self._last_ms = -1
+
+    def _holds_lease(self):
+        from .models import OrderIdNode
+
+        return OrderIdNode.objects.filter(node_id=self._node_id, owner=self._owner, expires_at=self._expires_at).exists()
+
+    def _confirm_lease(self, expires_at):
+        with self._lock:
+            if expires_at == self._expires_at:
+                self._lease_committed = True
+
+    def _get_node_id(self):
+        if self._fixed_node_id is not None:
+            return self._fixed_node_id
+        if self._node_id is not None and time.monotonic() < self._renew_at:
+            # a lease taken inside a transaction only counts once that commits. until then it's checked
+            # on every use, if the transaction was rolled back the row is gone and a new lease is taken
+            if self._lease_committed or self._holds_lease():
+                return self._node_id
+
+        self._node_id, self._expires_at = lease_node_id(self._owner, self._node_id)
+        # the lease runs on the database's clock, this process only needs to time half of it
+        self._renew_at = time.monotonic() + get_lease_duration().total_seconds() / 2
+        self._lease_committed = not transaction.get_connection().in_atomic_block
+        if not self._lease_committed:
+            expires_at = self._expires_at
+            transaction.on_commit(lambda: self._confirm_lease(expires_at))
+        return self._node_id
+
+    def next_id(self):
+        with self._lock:
+            # set up on first use, and again in a forked worker that inherited the parent's generator (and lease)
+            if self._pid != os.getpid():
+                self._reset()
+            node_id = self._get_node_id()
+
+            now = int(time.time() * 1000)
+            # never step backwards, even if the clock does
+            if now <= self._last_ms:
+                now = self._last_ms
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # the sequence ran out in this millisecond, borrow the next one
+                    now += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now
+
+            value = ((now - ORDER_ID_EPOCH_MS) << (NODE_BITS + SEQUENCE_BITS)) | (node_id << SEQUENCE_BITS) | self._sequence
+        return encode(value)
+
+order_id_generator = OrderIdGenerator()
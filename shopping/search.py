@@ -0,0 +1,117 @@
+import functools
+import re
+
+from django.db import connection
+from django.db.models import Case, When, Q, Value, BooleanField, FloatField, IntegerField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+# full-text search over the game catalog
+# sqlite keeps an FTS5 table (rowid = game id) that the Game signals keep in sync,
+# postgres uses a GIN expression index on the game table itself so it never drifts,
+# anything else falls back to a ranked icontains scan
+SEARCH_FIELDS = ('title', 'developer', 'publisher', 'description')
+SQLITE_TABLE = 'shopping_game_search'
+POSTGRES_INDEX = 'shopping_game_search_idx'
+
+# must match the expression in the postgres index (migration 0008) exactly or the planner won't use it
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(developer, '') || ' ' || coalesce(publisher, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'C')"
+)
+
+# bm25 column weights for title, developer, publisher, description
+SQLITE_WEIGHTS = (10.0, 3.0, 3.0, 1.0)
+
+DEFAULT_LIMIT = 1000
+
+def get_terms(query):
+    return re.findall(r'\w+', query.lower())
+
+def index_game(game):
+    # called from the Game post_save signal, only sqlite needs a hand here
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [game.id])
+        cursor.execute(
+            f"INSERT INTO {SQLITE_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) VALUES (%s, %s, %s, %s, %s)",
+            [game.id] + [getattr(game, field) for field in SEARCH_FIELDS],
+        )
+
+def unindex_game(game_id):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE} WHERE rowid = %s", [game_id])
+
+def rebuild_index():
+    # for when rows were changed without signals (queryset.update(), raw sql, fixtures)
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SQLITE_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SQLITE_TABLE} (rowid, {', '.join(SEARCH_FIELDS)}) "
+            f"SELECT id, {', '.join(SEARCH_FIELDS)} FROM shopping_game"
+        )
+
+def search_games(games, query):
+    # narrows the games queryset to matches for query, best match first. every term is matched as a
+    # prefix so it works while typing, and titles containing the query anywhere ("craft" in "Minecraft",
+    # which the index can't see) still match, ranked after the index hits. matching and ranking both
+    # happen in the database, so pagination and counts on the result see every match
+    terms = get_terms(query)
+    if not terms:
+        return games.none()
+    substring = Q(title__icontains=query.strip())
+
+    if connection.vendor == 'sqlite' and has_sqlite_index():
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        game_id = f'"{games.model._meta.db_table}"."id"'
+        matches = RawSQL(f"SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s", [match])
+        # bm25 is negative and lower for better matches, substring-only hits get 0 and go last
+        rank = RawSQL(
+            f"SELECT bm25({SQLITE_TABLE}, {weights}) FROM {SQLITE_TABLE} "
+            f"WHERE {SQLITE_TABLE} MATCH %s AND rowid = {game_id}",
+            [match], output_field=FloatField(),
+        )
+        return games.filter(Q(id__in=matches) | substring).annotate(
+            search_rank=Coalesce(rank, Value(0.0))
+        ).order_by('search_rank', 'id')
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        matches = RawSQL(f"({POSTGRES_VECTOR}) @@ to_tsquery('english', %s)", [tsquery], output_field=BooleanField())
+        rank = RawSQL(f"ts_rank(({POSTGRES_VECTOR}), to_tsquery('english', %s))", [tsquery], output_field=FloatField())
+        return games.filter(Q(matches) | substring).annotate(search_rank=rank).order_by('-search_rank', 'id')
+
+    return _scan_games(games, terms)
+
+def _scan_games(games, terms):
+    for term in terms:
+        games = games.filter(
+            Q(title__icontains=term) | Q(developer__icontains=term) |
+            Q(publisher__icontains=term) | Q(description__icontains=term)
+        )
+    # title hits first, then the rest
+    rank = Case(
+        When(title__icontains=terms[0], then=Value(0)),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    return games.annotate(search_rank=rank).order_by('search_rank', 'title')
+
+@functools.lru_cache(maxsize=None)
+def has_sqlite_index():
+    # sqlite built without FTS5 can't have the table, those fall back to the scan
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any(row[0] == 'ENABLE_FTS5' for row in cursor.fetchall())
+
+def search_game_ids(query, limit=DEFAULT_LIMIT):
+    # just the ids, best match first
+    from .models import Game
+
+    return list(search_games(Game.objects.all(), query).values_list('id', flat=True)[:limit])
@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Game, CartItem, Platform, Genre
+from . import search
+from .cart import invalidate_cart_totals
+from .versioning import bump_catalog_version
+from .suggestions import suggestion_index
+
+@receiver(post_save, sender=Game)
+def index_saved_game(sender, instance, **kwargs):
+    search.index_game(instance)
+    # the in-memory index can't roll back, so it only hears about committed changes
+    game_id, title = instance.id, instance.title
+    transaction.on_commit(lambda: suggestion_index.update_game(game_id, title))
+
+@receiver(post_delete, sender=Game)
+def unindex_deleted_game(sender, instance, **kwargs):
+    search.unindex_game(instance.id)
+    game_id = instance.id
+    transaction.on_commit(lambda: suggestion_index.remove_game(game_id))
+
+def _invalidate_after_commit(user_ids):
+    # clear now and again on commit, so a read that raced the transaction can't leave an old total cached
+    invalidate_cart_totals(user_ids)
+    transaction.on_commit(lambda: invalidate_cart_totals(user_ids))
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def invalidate_cart(sender, instance, **kwargs):
+    _invalidate_after_commit([instance.user_id])
+
+@receiver(post_save, sender=Game)
+def invalidate_carts_with_game(sender, instance, created=False, **kwargs):
+    # a price or sale change moves the subtotal of every cart holding the game
+    if created:
+        return
+    user_ids = list(CartItem.objects.filter(game_id=instance.id).values_list('user_id', flat=True))
+    if user_ids:
+        _invalidate_after_commit(user_ids)
+
+@receiver(post_save, sender=Game)
+@receiver(post_delete, sender=Game)
+@receiver(post_save, sender=Platform)
+@receiver(post_delete, sender=Platform)
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+@receiver(m2m_changed, sender=Game.platforms.through)
+@receiver(m2m_changed, sender=Game.genres.through)
+def bump_catalog(sender, action=None, **kwargs):
+    # m2m_changed fires before and after, only the post_ actions change anything
+    if action is not None and not action.startswith('post_'):
+        return
+    # same as the cart totals, bump now and again once the write is visible to other connections
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+@receiver(m2m_changed, sender=Game.platforms.through)
+@receiver(m2m_changed, sender=Game.genres.through)
+def touch_games_on_m2m_change(sender, instance, action, reverse, pk_set, **kwargs):
+    # updated_at drives the game detail ETag, so platform/genre edits have to move it too
+    if reverse and action == 'pre_clear':
+        # a reverse clear doesn't say which games lose the relation, remember them before the rows go
+        instance._cleared_game_ids = list(
+            sender.objects.filter(**{instance._meta.model_name: instance}).values_list('game_id', flat=True)
+        )
+        return
+    if not action.startswith('post_'):
+        return
+
+    if not reverse:
+        game_ids = [instance.id]
+    elif action == 'post_clear':
+        game_ids = getattr(instance, '_cleared_game_ids', [])
+    else:
+        game_ids = list(pk_set or [])
+    if game_ids:
+        Game.objects.filter(id__in=game_ids).update(updated_at=timezone.now())
+
+# renames and deletes. a delete takes the m2m rows with it without an m2m_changed,
+# so it's handled before the rows go
+@receiver(post_save, sender=Platform)
+@receiver(pre_delete, sender=Platform)
+def touch_games_on_platform_change(sender, instance, created=False, **kwargs):
+    if not created:
+        Game.objects.filter(platforms=instance).update(updated_at=timezone.now())
+
+@receiver(post_save, sender=Genre)
+@receiver(pre_delete, sender=Genre)
+def touch_games_on_genre_change(sender, instance, created=False, **kwargs):
+    if not created:
+        Game.objects.filter(genres=instance).update(updated_at=timezone.now())
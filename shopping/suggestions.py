@@ -0,0 +1,191 @@
+import heapq
+import re
+import sys
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+# in-process word prefix index of game titles used for type-ahead suggestions
+# every worker keeps its own copy, built lazily from the database on the first lookup and then
+# kept up to date by the Game signals. other workers only see a change after MAX_AGE seconds,
+# when they rebuild from the database
+DEFAULTS = {
+    'MEMORY_BUDGET': 8 * 1024 * 1024,  # bytes
+    'MAX_PREFIX_LENGTH': 12,
+    'MAX_AGE': 300,  # seconds
+}
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'SEARCH_SUGGESTIONS', {})}
+
+def get_words(text):
+    return re.findall(r'\w+', text.lower())
+
+class SuggestionIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        # drops everything, the next lookup rebuilds from the database
+        with self._lock:
+            self._titles = {}  # game id -> (title, lowercased title, words)
+            self._prefixes = {}  # word prefix -> set of game ids
+            self._max_prefix_length = get_config()['MAX_PREFIX_LENGTH']
+            self._loaded_at = None
+            self._pending = None  # changes seen while a rebuild reads the database, (game id, title or None)
+
+    def _add(self, game_id, title):
+        words = get_words(title)
+        self._titles[game_id] = (title, title.lower(), words)
+        for word in words:
+            for length in range(1, min(len(word), self._max_prefix_length) + 1):
+                self._prefixes.setdefault(word[:length], set()).add(game_id)
+
+    def _remove(self, game_id):
+        entry = self._titles.pop(game_id, None)
+        if entry is None:
+            return
+        for word in entry[2]:
+            for length in range(1, min(len(word), self._max_prefix_length) + 1):
+                prefix = word[:length]
+                game_ids = self._prefixes.get(prefix)
+                if game_ids is not None:
+                    game_ids.discard(game_id)
+                    if not game_ids:
+                        del self._prefixes[prefix]
+
+    def estimate_size(self):
+        # rough byte count of the index structures (keys, sets and title tuples)
+        size = sys.getsizeof(self._prefixes) + sys.getsizeof(self._titles)
+        for prefix, game_ids in self._prefixes.items():
+            size += sys.getsizeof(prefix) + sys.getsizeof(game_ids)
+        for title, lowered, words in self._titles.values():
+            size += sys.getsizeof(title) + sys.getsizeof(lowered) + sum(sys.getsizeof(word) for word in words)
+        return size
+
+    def _load_rows(self):
+        from .models import Game
+
+        return list(Game.objects.values_list('id', 'title'))
+
+    def rebuild(self):
+        config = get_config()
+        with self._lock:
+            # updates that come in while the rows are being read are replayed after the swap,
+            # otherwise the older rows would overwrite them
+            self._pending = []
+        rows = self._load_rows()
+        with self._lock:
+            # shorter prefixes shrink the index, long terms are still answered by checking the words of each candidate
+            max_prefix_length = config['MAX_PREFIX_LENGTH']
+            while True:
+                self._titles = {}
+                self._prefixes = {}
+                self._max_prefix_length = max_prefix_length
+                for game_id, title in rows:
+                    self._add(game_id, title)
+                if max_prefix_length <= 1 or self.estimate_size() <= config['MEMORY_BUDGET']:
+                    break
+                max_prefix_length -= 1
+            for game_id, title in self._pending or ():
+                self._remove(game_id)
+                if title is not None:
+                    self._add(game_id, title)
+            self._pending = None
+            self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if not self._is_stale():
+            return
+        # only one thread rebuilds, the others wait and then use the fresh index
+        with self._rebuild_lock:
+            if self._is_stale():
+                self.rebuild()
+
+    def _is_stale(self):
+        loaded_at = self._loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > get_config()['MAX_AGE']
+
+    def update_game(self, game_id, title):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((game_id, title))
+            if self._loaded_at is None:
+                return
+            self._remove(game_id)
+            self._add(game_id, title)
+
+    def remove_game(self, game_id):
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append((game_id, None))
+            if self._loaded_at is None:
+                return
+            self._remove(game_id)
+
+    def suggest(self, query, limit=10):
+        # every query word has to prefix a word in the title, titles starting with the query rank first
+        terms = get_words(query)
+        if not terms:
+            return []
+        self._ensure_loaded()
+        return self._suggest_loaded(query, terms, limit)
+
+    async def asuggest(self, query, limit=10):
+        # for the async views: only a (re)build touches the database, so only that leaves the event loop.
+        # the lookup after it never loads, even if the index went stale in between
+        terms = get_words(query)
+        if not terms:
+            return []
+        if self._is_stale():
+            await sync_to_async(self._ensure_loaded)()
+        return self._suggest_loaded(query, terms, limit)
+
+    def _suggest_loaded(self, query, terms, limit):
+        # the lookup itself, on whatever index is loaded right now. word prefix matches come first, titles
+        # starting with the query ahead of the rest. when those don't fill the limit, titles that contain
+        # the query anywhere else ("craft" in "Minecraft") fill it up
+        query_lowered = query.strip().lower()
+        with self._lock:
+            candidates = None
+            for term in sorted(terms, key=len, reverse=True):
+                game_ids = self._prefixes.get(term[:self._max_prefix_length], set())
+                candidates = set(game_ids) if candidates is None else candidates & game_ids
+                if not candidates:
+                    break
+
+            matches = []
+            for game_id in candidates:
+                title, lowered, words = self._titles[game_id]
+                if any(len(term) > self._max_prefix_length for term in terms):
+                    if not all(any(word.startswith(term) for word in words) for term in terms):
+                        continue
+                matches.append((0 if lowered.startswith(query_lowered) else 1, lowered, game_id, title))
+
+            if len(matches) < limit:
+                matched = {match[2] for match in matches}
+                matches.extend(
+                    (2, lowered, game_id, title) for game_id, (title, lowered, _) in self._titles.items()
+                    if game_id not in matched and query_lowered in lowered
+                )
+
+        best = heapq.nsmallest(limit, matches)
+        return [{'id': game_id, 'title': title} for _, _, game_id, title in best]
+
+    def stats(self):
+        config = get_config()
+        with self._lock:
+            return {
+                'loaded': self._loaded_at is not None,
+                'games': len(self._titles),
+                'prefixes': len(self._prefixes),
+                'max_prefix_length': self._max_prefix_length,
+                'estimated_bytes': self.estimate_size(),
+                'memory_budget': config['MEMORY_BUDGET'],
+            }
+
+suggestion_index = SuggestionIndex()
@@ -0,0 +1,32 @@
+import uuid
+
+from django.core.cache import caches
+
+# the catalog version is a token shared through the catalog cache. any Game/Platform/Genre write
+# replaces it, which orphans every cached catalog response at once instead of deleting them one by one
+CATALOG_CACHE = 'catalog'
+VERSION_KEY = 'catalog:version'
+
+def get_catalog_cache():
+    return caches[CATALOG_CACHE]
+
+def get_catalog_version():
+    cache = get_catalog_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # evicted or never set, start a fresh token (add() so concurrent workers agree on one)
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+async def aget_catalog_version():
+    # same as get_catalog_version, for the async views
+    cache = get_catalog_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+def bump_catalog_version():
+    get_catalog_cache().set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        # fail at startup rather than on the first card, a missing or bad key would
+        # leave this worker unable to read what the others encrypt. whether the keys match the
+        # other workers' needs the database, that's checked on first use (crypto.get_checked_keyring)
+        from . import crypto
+        crypto.get_keyring()
+
+        # keeps the cached token authentication in step with logouts and user changes
+        from . import signals
@@ -0,0 +1,102 @@
+import copy
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+DEFAULTS = {
+    'TTL': 60,
+    'MAX_SIZE': 10000,
+    # seconds a token stays valid after it was created, None for never
+    'EXPIRY': None,
+    # shared cache holding the per-user versions, needs to be shared between workers for revocation to reach them all
+    'CACHE': 'default',
+}
+
+def get_token_settings():
+    return {**DEFAULTS, **getattr(settings, 'AUTH_TOKEN', {})}
+
+def get_version_key(user_id):
+    return f'auth:user-version:{user_id}'
+
+def get_user_version(user_id):
+    cache = caches[get_token_settings()['CACHE']]
+    key = get_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # evicted or never set, start a fresh one (add() so concurrent workers agree on it)
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+def bump_user_version(user_id):
+    # orphans every cached token of the user, in every worker sharing the cache
+    caches[get_token_settings()['CACHE']].set(get_version_key(user_id), uuid.uuid4().hex, timeout=None)
+
+# per-process LRU of token key -> (user, token), so an authenticated request doesn't need the
+# token/user query. each entry remembers the user's version from the shared cache and only counts
+# while it still matches, so logout or saving the user (password change, deactivation) revokes it
+# everywhere with a single bump, see users.signals
+class TokenCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        user, token, version = entry[:3]
+        if get_user_version(user.pk) != version:
+            self.invalidate_key(key)
+            return None
+        return user, token
+
+    def set(self, key, user, token):
+        options = get_token_settings()
+        version = get_user_version(user.pk)
+        with self._lock:
+            self._entries[key] = (user, token, version, time.monotonic() + options['TTL'])
+            self._entries.move_to_end(key)
+            while len(self._entries) > options['MAX_SIZE']:
+                self._entries.popitem(last=False)
+
+    def invalidate_key(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+token_cache = TokenCache()
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user, token)
+        else:
+            user, token = cached
+
+        expiry = get_token_settings()['EXPIRY']
+        if expiry is not None and token.created < timezone.now() - timedelta(seconds=expiry):
+            # deleting it lets the token endpoint hand out a fresh one on the next login
+            token.delete()
+            raise AuthenticationFailed('Token has expired.')
+
+        # views get their own copy, the cached instance is shared between requests
+        return copy.copy(user), token
@@ -1,19 +1,38 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db.models.functions import Lower
+
+from . import hashers
 
 User = get_user_model()
 
 class UsernameOrEmailBackend(ModelBackend):
+    # case-insensitive lookups on the email or the username (never an OR of both), which the Lower()
+    # unique constraints on User cover. this is the only backend, so a failed login hashes once
+    def get_user_by_identifier(self, identifier):
+        # usernames may contain an @ too, so an identifier with one that isn't an email is tried as a username
+        fields = ('email', 'username') if '@' in identifier else ('username',)
+        for field in fields:
+            user = User.objects.alias(lookup=Lower(field)).filter(lookup=identifier.lower()).first()
+            if user is not None:
+                return user
+        return None
+
     def authenticate(self, request, username=None, password=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
         if username is None or password is None:
             return None
-        try:
-            user = User.objects.get(
-                Q(username=username) | Q(email=username)
-            )
-        except User.DoesNotExist:
+        user = self.get_user_by_identifier(username)
+        if user is None:
+            # hash the password anyway so unknown users take as long as wrong passwords
+            hashers.make_password(password)
+            return None
+        matches, needs_rehash = hashers.check_password(password, user.password)
+        if not matches or not self.user_can_authenticate(user):
             return None
-        if user.check_password(password) and self.user_can_authenticate(user):
-            return user
-        return None
\ No newline at end of file
+        if needs_rehash:
+            # the hash is from an older hasher or work factor, upgrade it now that we have the password
+            hashers.set_password(user, password)
+            user.save(update_fields=['password'])
+        return user
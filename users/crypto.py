@@ -0,0 +1,195 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import Counter
+
+from cryptography.fernet import Fernet, InvalidToken
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+KEY_SETTINGS = ('ENCRYPTION_KEY', 'ENCRYPTION_KEYS', 'ENCRYPTION_KEYRING_FILE')
+
+# the card encryption keyring. every key has an id, the first (primary) key encrypts and all of them
+# can decrypt, so a new key can be put in front of the old ones and the old data re-encrypted at
+# leisure (manage.py rotate_card_keys). keys only ever come from configuration, never generated,
+# so every worker and every restart can read what the others wrote. to catch workers configured with
+# different keys under the same id, each key id has a check value in the database (EncryptionKeyCheck)
+# encrypted by the first worker to use it. a worker whose key can't read it refuses to encrypt or decrypt
+def key_id_for(key):
+    # keys given without an id get a fingerprint, which is the same on every worker
+    return hashlib.sha256(key.encode()).hexdigest()[:8]
+
+def _parse_entry(entry):
+    if isinstance(entry, (tuple, list)):
+        key_id, key = entry
+    elif ':' in entry:
+        key_id, key = entry.split(':', 1)
+    else:
+        key_id, key = None, entry
+    key = key.strip()
+    return (key_id.strip() if key_id else key_id_for(key)), key
+
+def _read_keyring_file(path):
+    # {"primary": "<id>", "keys": {"<id>": "<key>", ...}}
+    try:
+        with open(path) as f:
+            data = json.load(f)
+        keys = data['keys']
+        primary = data.get('primary') or next(iter(keys))
+        return [(primary, keys[primary])] + [(key_id, key) for key_id, key in keys.items() if key_id != primary]
+    except (OSError, ValueError, KeyError, StopIteration, TypeError) as e:
+        raise ImproperlyConfigured(f'Could not read ENCRYPTION_KEYRING_FILE {path}: {e}')
+
+def load_keys():
+    # [(key_id, key), ...] primary first, from the keyring file, ENCRYPTION_KEYS or a lone ENCRYPTION_KEY
+    path = getattr(settings, 'ENCRYPTION_KEYRING_FILE', None)
+    if path:
+        return _read_keyring_file(path)
+    entries = getattr(settings, 'ENCRYPTION_KEYS', None) or []
+    if isinstance(entries, str):
+        entries = [entry for entry in entries.split(',') if entry.strip()]
+    if not entries and getattr(settings, 'ENCRYPTION_KEY', None):
+        entries = [settings.ENCRYPTION_KEY]
+    return [_parse_entry(entry) for entry in entries]
+
+class Keyring:
+    def __init__(self, keys):
+        if not keys:
+            raise ImproperlyConfigured(
+                'No card encryption key configured. Set ENCRYPTION_KEYS, ENCRYPTION_KEYRING_FILE or ENCRYPTION_KEY '
+                '(the same value on every worker).'
+            )
+        self._fernets = []
+        for key_id, key in keys:
+            if key_id in self.key_ids:
+                raise ImproperlyConfigured(f'Duplicate encryption key id {key_id!r}.')
+            try:
+                self._fernets.append((key_id, Fernet(key)))
+            except (ValueError, TypeError):
+                raise ImproperlyConfigured(f'Encryption key {key_id!r} is not a valid Fernet key.')
+
+    @property
+    def key_ids(self):
+        return [key_id for key_id, _ in self._fernets]
+
+    @property
+    def primary_id(self):
+        return self._fernets[0][0]
+
+    def encrypt(self, value):
+        return self._fernets[0][1].encrypt(value)
+
+    def encrypt_with(self, key_id, value):
+        return dict(self._fernets)[key_id].encrypt(value)
+
+    def can_decrypt_with(self, key_id, token):
+        try:
+            dict(self._fernets)[key_id].decrypt(token)
+        except InvalidToken:
+            return False
+        return True
+
+    def decrypt(self, token):
+        # (key id, plaintext bytes), the primary key is tried first
+        for key_id, fernet in self._fernets:
+            try:
+                return key_id, fernet.decrypt(token)
+            except InvalidToken:
+                continue
+        raise InvalidToken
+
+CHECK_VALUE = b'card encryption key check'
+
+_lock = threading.Lock()
+_check_lock = threading.Lock()
+_keyring = None
+_checked = None
+_metrics = Counter()
+
+def get_keyring():
+    global _keyring
+    if _keyring is None:
+        with _lock:
+            if _keyring is None:
+                _keyring = Keyring(load_keys())
+    return _keyring
+
+def check_keyring(keyring):
+    # records a check value for every key id that doesn't have one yet, then makes sure our key
+    # under each id can read the recorded one
+    from .models import EncryptionKeyCheck
+
+    with transaction.atomic():
+        EncryptionKeyCheck.objects.bulk_create(
+            [EncryptionKeyCheck(key_id=key_id, token=keyring.encrypt_with(key_id, CHECK_VALUE)) for key_id in keyring.key_ids],
+            ignore_conflicts=True,
+        )
+    for key_id, token in EncryptionKeyCheck.objects.filter(key_id__in=keyring.key_ids).values_list('key_id', 'token'):
+        if not keyring.can_decrypt_with(key_id, bytes(token)):
+            raise ImproperlyConfigured(
+                f'Encryption key {key_id!r} is not the key other workers use under that id. '
+                'Every worker needs the same keyring.'
+            )
+
+def get_checked_keyring():
+    # get_keyring, checked against the database once per process (the first time a card is encrypted or decrypted)
+    global _checked
+    keyring = get_keyring()
+    if _checked is not keyring:
+        with _check_lock:
+            if _checked is not keyring:
+                check_keyring(keyring)
+                _checked = keyring
+    return keyring
+
+def reset():
+    global _keyring, _checked
+    with _lock:
+        _keyring = None
+        _checked = None
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting in KEY_SETTINGS:
+        reset()
+
+def decrypt_metrics():
+    # successful decrypts per key id plus failures, once an old key stops showing up it can be dropped
+    with _lock:
+        return dict(_metrics)
+
+def reset_metrics():
+    with _lock:
+        _metrics.clear()
+
+def _count(name):
+    with _lock:
+        _metrics[name] += 1
+
+def encrypt(value):
+    return get_checked_keyring().encrypt(value.encode())
+
+def decrypt(token):
+    # the plaintext, or None if no key we have can read it
+    try:
+        key_id, value = get_checked_keyring().decrypt(bytes(token))
+    except InvalidToken:
+        _count('failed')
+        logger.warning('Could not decrypt value with any of the encryption keys %s', get_keyring().key_ids)
+        return None
+    _count(key_id)
+    return value.decode()
+
+def rotate(token):
+    # the token re-encrypted under the primary key, None if it already is
+    keyring = get_checked_keyring()
+    key_id, value = keyring.decrypt(bytes(token))
+    if key_id == keyring.primary_id:
+        return None
+    return keyring.encrypt(value)
@@ -0,0 +1,79 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULTS = {
+    # None keeps Django's default for the installed version
+    'PBKDF2_ITERATIONS': None,
+    # password hashes allowed to run at once in this process, and how long a request waits for a turn
+    'MAX_CONCURRENT': 2,
+    'TIMEOUT': 5,
+}
+
+def get_hashing_settings():
+    return {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING', {})}
+
+class TunablePBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    # same algorithm name as Django's, so existing hashes keep verifying. when the iteration count
+    # changes, must_update() flags the old hashes and they're rehashed on the next successful login
+    @property
+    def iterations(self):
+        return get_hashing_settings()['PBKDF2_ITERATIONS'] or hashers.PBKDF2PasswordHasher.iterations
+
+class HashingBusy(Exception):
+    # raised from inside authenticate() as well as the API views, so it's turned into a 503 both by the
+    # DRF exception handler (api.exceptions) and, for everything else (admin login...), users.middleware
+    message = 'Too many sign ins right now, please try again shortly.'
+    retry_after = 1  # seconds
+
+    def __init__(self, message=None):
+        super().__init__(message or self.message)
+
+# hashing is deliberately slow, so only a few run at once and a signup/login surge waits
+# (or gets a 503) instead of taking every core from the catalog requests on the same worker
+_lock = threading.Lock()
+_slots = None
+
+def _get_slots():
+    global _slots
+    with _lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(get_hashing_settings()['MAX_CONCURRENT'])
+        return _slots
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    global _slots
+    if setting == 'PASSWORD_HASHING':
+        with _lock:
+            _slots = None
+
+@contextmanager
+def hashing_slot():
+    slots = _get_slots()
+    if not slots.acquire(timeout=get_hashing_settings()['TIMEOUT']):
+        raise HashingBusy()
+    try:
+        yield
+    finally:
+        slots.release()
+
+def make_password(password):
+    with hashing_slot():
+        return hashers.make_password(password)
+
+def check_password(password, encoded):
+    # (matches, needs_rehash), the rehash itself is left to the caller
+    needs_rehash = []
+    with hashing_slot():
+        matches = hashers.check_password(password, encoded, setter=lambda raw: needs_rehash.append(True))
+    return matches, bool(needs_rehash)
+
+def set_password(user, password):
+    # User.set_password, inside a hashing slot
+    user.password = make_password(password)
+    user._password = password
@@ -0,0 +1,53 @@
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory
+from api.api import UserSignUp
+import time
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    help = 'Benchmark UserSignUp throughput and queries per signup (everything is rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--signups', type=int, default=200, help='Signups per run')
+        parser.add_argument('--runs', type=int, default=3, help='Runs, the best one is reported')
+        parser.add_argument(
+            '--iterations', type=int, default=None,
+            help='PBKDF2 iterations to use, a low number leaves just the request and database cost'
+        )
+
+    def handle(self, *args, **kwargs):
+        hashing = {'PBKDF2_ITERATIONS': kwargs['iterations']} if kwargs['iterations'] else {}
+        with override_settings(PASSWORD_HASHING=hashing):
+            results = [self.run(kwargs['signups'], run) for run in range(kwargs['runs'])]
+        best, queries = min(results)
+        rate = kwargs['signups'] / best
+        self.stdout.write(
+            f'{rate:,.0f} signups/sec ({best:.3f}s for {kwargs["signups"]} signups, '
+            f'{queries / kwargs["signups"]:.1f} queries each)'
+        )
+
+    def run(self, count, run):
+        view = UserSignUp.as_view()
+        factory = APIRequestFactory()
+        requests = [
+            factory.post('/api/user/create/', {
+                'username': f'bench_signup_{run}_{i}',
+                'email': f'bench_signup_{run}_{i}@example.com',
+                'password': 'bench-password',
+            }, format='json')
+            for i in range(count)
+        ]
+        try:
+            with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for request in requests:
+                    response = view(request)
+                    assert response.status_code == 200, response.data
+                elapsed = time.perf_counter() - start
+                raise Rollback()
+        except Rollback:
+            return elapsed, len(queries)
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from users import crypto
+from users.models import CreditCard
+
+class Command(BaseCommand):
+    help = 'Re-encrypt stored card numbers with the primary encryption key (the first in the keyring)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        rotated = failed = 0
+        last_pk = 0
+        # walk the cards by primary key so each batch is one query and one bulk update
+        while True:
+            cards = list(
+                CreditCard.objects.filter(pk__gt=last_pk, encrypted_card_number__isnull=False)
+                .only('id', 'encrypted_card_number')
+                .order_by('pk')[:batch_size]
+            )
+            if not cards:
+                break
+            last_pk = cards[-1].pk
+
+            changed = []
+            for card in cards:
+                try:
+                    token = crypto.rotate(card.encrypted_card_number)
+                except crypto.InvalidToken:
+                    failed += 1
+                    continue
+                # already under the primary key
+                if token is None:
+                    continue
+                card.encrypted_card_number = token
+                changed.append(card)
+            CreditCard.objects.bulk_update(changed, ['encrypted_card_number'])
+            rotated += len(changed)
+
+        self.stdout.write(self.style.SUCCESS(f'Re-encrypted {rotated} cards.'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'{failed} cards could not be decrypted with any configured key.'))
@@ -0,0 +1,19 @@
+from django.http import HttpResponse
+
+from .hashers import HashingBusy
+
+class HashingBusyMiddleware:
+    # a login that couldn't get a hashing slot is a 503 outside the API too (the admin login and
+    # anything else that calls authenticate()), the API views get theirs from api.exceptions
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, HashingBusy):
+            return None
+        response = HttpResponse(str(exception), status=503, content_type='text/plain')
+        response['Retry-After'] = str(exception.retry_after)
+        return response
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_user_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EncryptionKeyCheck',
+            fields=[
+                ('key_id', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('token', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
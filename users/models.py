@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from django.conf import settings
-from cryptography.fernet import Fernet
+from django.db.models.functions import Lower
+from . import crypto
 import hashlib
 
 # Create your models here.
@@ -17,12 +17,28 @@ class User(AbstractUser):
     )
     email = models.EmailField(unique=True)
 
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # "Bob" and "bob" are the same account, these also back the case-insensitive login lookups (see users.backends)
+            models.UniqueConstraint(Lower('username'), name='user_username_lower_uniq'),
+            models.UniqueConstraint(Lower('email'), name='user_email_lower_uniq'),
+        ]
+
     def name(self):
         return f"{self.first_name} {self.last_name}" if self.first_name and self.last_name else self.username
 
     def __str__(self):
         return self.username
     
+class EncryptionKeyCheck(models.Model):
+    """A known value encrypted with a card encryption key, so every worker can tell it holds the same key (see users.crypto)"""
+    key_id = models.CharField(max_length=64, primary_key=True)
+    token = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Check value for encryption key {self.key_id}"
+
 class CreditCard(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='credit_cards')
     name_on_card = models.CharField(max_length=100)
@@ -43,10 +59,8 @@ class CreditCard(models.Model):
             # make sure we have a temp card number to process
             self.last_four_digits = self._temp_card_number[-4:] # gets last 4 digits
             self.card_number_hash = hashlib.sha256(self._temp_card_number.encode()).hexdigest() # hash's the card number
-            if hasattr(settings, 'ENCRYPTION_KEY'):
-                # if the encryption key is set then encrypt the card number!
-                f = Fernet(settings.ENCRYPTION_KEY)
-                self.encrypted_card_number = f.encrypt(self._temp_card_number.encode())
+            # encrypt the card number with the primary key (see users.crypto)
+            self.encrypted_card_number = crypto.encrypt(self._temp_card_number)
 
             # determine the card brand
             self.card_brand = self._determine_card_brand(self._temp_card_number)
@@ -67,22 +81,12 @@ class CreditCard(models.Model):
 
     def get_decrypted_card_number(self):
         # decrypts the card number (this is used for autofill purposes)
-        if self.encrypted_card_number and hasattr(settings, 'ENCRYPTION_KEY'):
-            try:
-                # if there is an encryption key set, decrypt the card number
-                f = Fernet(settings.ENCRYPTION_KEY)
-                decrypted_bytes = f.decrypt(self.encrypted_card_number)
-                return decrypted_bytes.decode()
-            except Exception as e:
-                print(f"Decryption error: {e}")
-                return None
+        if self.encrypted_card_number:
+            return crypto.decrypt(self.encrypted_card_number)
         return None
 
     def get_masked_card_number(self):
-        # return the decrypted card number with only last 4 digits visible
-        full_number = self.get_decrypted_card_number()
-        if full_number:
-            return f"****{self.last_four_digits}"
+        # only the last 4 digits are visible, no need to decrypt anything for that
         return f"****{self.last_four_digits}"
 
     def __str__(self):
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .models import User
+from .authentication import bump_user_version, token_cache
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate_key(instance.key)
+    bump_user_version(instance.user_id)
+
+@receiver(post_save, sender=User)
+def forget_saved_user(sender, instance, created=False, **kwargs):
+    # a password change or deactivation has to take effect straight away
+    if not created:
+        bump_user_version(instance.pk)
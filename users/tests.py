@@ -1,3 +1,298 @@
-from django.test import TestCase
+import json
+import os
+import runpy
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from cryptography.fernet import Fernet
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from backend import settings as settings_module
+from users import crypto
+from users.authentication import TokenCache, bump_user_version, token_cache
+from users.backends import UsernameOrEmailBackend
+from users import hashers
+from users.models import User, CreditCard, EncryptionKeyCheck
+
+OLD_KEY = Fernet.generate_key().decode()
+NEW_KEY = Fernet.generate_key().decode()
+
+
+def create_card(user, number='4111111111111111'):
+    card = CreditCard(user=user, name_on_card='Test User', expiration_date='2099-12-01')
+    card.set_card_number(number)
+    card.save()
+    return card
+
+
+@override_settings(ENCRYPTION_KEYS=f'old:{OLD_KEY}', ENCRYPTION_KEYRING_FILE=None)
+class CardEncryptionTests(TestCase):
+    def setUp(self):
+        crypto.reset_metrics()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_round_trip(self):
+        card = create_card(self.user)
+        card = CreditCard.objects.get(pk=card.pk)
+        self.assertEqual(card.get_decrypted_card_number(), '4111111111111111')
+        self.assertEqual(card.card_brand, 'Visa')
+
+    def test_masked_number_does_not_decrypt(self):
+        card = create_card(self.user)
+        with mock.patch.object(crypto, 'decrypt') as decrypt:
+            self.assertEqual(card.get_masked_card_number(), '****1111')
+        decrypt.assert_not_called()
+
+    def test_rotation(self):
+        card = create_card(self.user)
+        with override_settings(ENCRYPTION_KEYS=f'new:{NEW_KEY},old:{OLD_KEY}'):
+            # the old key still decrypts until the cards are rotated
+            self.assertEqual(CreditCard.objects.get(pk=card.pk).get_decrypted_card_number(), '4111111111111111')
+            call_command('rotate_card_keys', batch_size=1, stdout=StringIO())
+        with override_settings(ENCRYPTION_KEYS=f'new:{NEW_KEY}'):
+            self.assertEqual(CreditCard.objects.get(pk=card.pk).get_decrypted_card_number(), '4111111111111111')
+        with override_settings(ENCRYPTION_KEYS=f'old:{OLD_KEY}'), self.assertLogs('users.crypto', level='WARNING'):
+            self.assertIsNone(CreditCard.objects.get(pk=card.pk).get_decrypted_card_number())
+
+    def test_user_view_only_decrypts_for_autofill(self):
+        create_card(self.user)
+        response = self.client.get(reverse('api:user'))
+        self.assertEqual(response.data['data']['credit_cards'][0]['cardNumber'], '****1111')
+        response = self.client.get(reverse('api:user'), {'autofill': 'true'})
+        self.assertEqual(response.data['data']['credit_cards'][0]['cardNumber'], '4111111111111111')
+
+    def test_decrypts_are_counted_per_key(self):
+        card = create_card(self.user)
+        with override_settings(ENCRYPTION_KEYS=f'new:{NEW_KEY},old:{OLD_KEY}'):
+            create_card(self.user, '5500000000000004')
+            for card in CreditCard.objects.all():
+                card.get_decrypted_card_number()
+        self.assertEqual(crypto.decrypt_metrics(), {'new': 1, 'old': 1})
+
+    def test_keyring_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump({'primary': 'new', 'keys': {'old': OLD_KEY, 'new': NEW_KEY}}, f)
+            f.flush()
+            with override_settings(ENCRYPTION_KEYRING_FILE=f.name):
+                self.assertEqual(crypto.get_keyring().key_ids, ['new', 'old'])
+
+    def test_bare_keys_get_a_stable_id(self):
+        with override_settings(ENCRYPTION_KEYS='', ENCRYPTION_KEY=OLD_KEY):
+            self.assertEqual(crypto.get_keyring().key_ids, [crypto.key_id_for(OLD_KEY)])
+
+    def test_bad_configuration_refuses_to_start(self):
+        for options in (
+            {'ENCRYPTION_KEYS': '', 'ENCRYPTION_KEY': None},
+            {'ENCRYPTION_KEYS': 'old:not-a-key'},
+            {'ENCRYPTION_KEYS': f'old:{OLD_KEY},old:{NEW_KEY}'},
+        ):
+            with self.subTest(options=options), override_settings(**options):
+                with self.assertRaises(ImproperlyConfigured):
+                    crypto.get_keyring()
+
+
+    def test_workers_with_different_keys_refuse_to_run(self):
+        # this worker records a check value for 'old', another one has a different key under that id
+        crypto.reset()
+        create_card(self.user)
+        with override_settings(ENCRYPTION_KEYS=f'old:{NEW_KEY}'):
+            with self.assertRaises(ImproperlyConfigured):
+                create_card(self.user, '5500000000000004')
+            with self.assertRaises(ImproperlyConfigured):
+                CreditCard.objects.get().get_decrypted_card_number()
+        # a keyring that agrees, plus a new key, is fine
+        with override_settings(ENCRYPTION_KEYS=f'new:{NEW_KEY},old:{OLD_KEY}'):
+            create_card(self.user, '5500000000000004')
+        self.assertEqual(set(EncryptionKeyCheck.objects.values_list('key_id', flat=True)), {'old', 'new'})
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        token_cache.clear()
+        self.user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def summary(self):
+        return self.client.get(reverse('api:user'), {'include': ''})
+
+    def test_second_request_skips_the_token_query(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.summary().status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.summary().status_code, 200)
+
+    def test_logout(self):
+        self.summary()
+        self.assertEqual(self.client.post(reverse('api:user_logout')).status_code, 200)
+        self.assertFalse(Token.objects.exists())
+        self.assertEqual(self.summary().status_code, 401)
+
+    def test_deactivation_and_password_change(self):
+        self.summary()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.summary().status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.summary()
+        self.user.set_password('another-password')
+        self.user.save()
+        # the token itself survives a password change, but the user is loaded fresh
+        with self.assertNumQueries(1):
+            self.summary()
+
+    def test_revocation_reaches_other_workers(self):
+        # another worker with its own cache, holding the same token
+        other = TokenCache()
+        other.set(self.token.key, self.user, self.token)
+        self.summary()
+        bump_user_version(self.user.pk)
+        self.assertIsNone(other.get(self.token.key))
+        # just the token lookup again
+        with self.assertNumQueries(1):
+            self.summary()
+
+    @override_settings(AUTH_TOKEN={'EXPIRY': 60})
+    def test_expired_token(self):
+        self.assertEqual(self.summary().status_code, 200)
+        Token.objects.filter(pk=self.token.pk).update(created=self.token.created - timedelta(minutes=5))
+        token_cache.clear()
+        self.assertEqual(self.summary().status_code, 401)
+        self.assertFalse(Token.objects.exists())
+
+
+class UsernameOrEmailBackendTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Tester', email='Tester@Example.com', password='password123')
+        self.backend = UsernameOrEmailBackend()
+
+    def test_case_insensitive_single_query(self):
+        for identifier in ('tester', 'TESTER', 'tester@example.com'):
+            with self.subTest(identifier=identifier), self.assertNumQueries(1):
+                self.assertEqual(self.backend.authenticate(None, username=identifier, password='password123'), self.user)
+
+    def test_wrong_password_and_inactive(self):
+        self.assertIsNone(self.backend.authenticate(None, username='tester', password='wrong'))
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.authenticate(None, username='tester', password='password123'))
+
+    def test_unknown_user_still_hashes(self):
+        with mock.patch.object(hashers, 'make_password') as make_password:
+            self.assertIsNone(self.backend.authenticate(None, username='nobody@example.com', password='password123'))
+        make_password.assert_called_once_with('password123')
+
+    def test_case_only_duplicates_are_refused(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user(username='tester', email='other@example.com', password='password123')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            User.objects.create_user(username='other', email='TESTER@example.com', password='password123')
+
+    def test_username_with_an_at_sign(self):
+        # not an email, so the email index misses and the username index is tried next
+        user = User.objects.create_user(username='bob@home', email='bob@example.com', password='password123')
+        with self.assertNumQueries(2):
+            self.assertEqual(self.backend.authenticate(None, username='Bob@Home', password='password123'), user)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.authenticate(None, username='bob@example.com', password='password123'), user)
+
+    def test_token_endpoint(self):
+        response = APIClient().post(reverse('api-token-auth'), {'username': 'TESTER@example.com', 'password': 'password123'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['token'], Token.objects.get(user=self.user).key)
+
+
+class PasswordHashingTests(TestCase):
+    def test_work_factor_comes_from_settings_and_upgrades_on_login(self):
+        with override_settings(PASSWORD_HASHING={'PBKDF2_ITERATIONS': 1000}):
+            user = User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$1000$'))
+
+        with override_settings(PASSWORD_HASHING={'PBKDF2_ITERATIONS': 2000}):
+            self.assertEqual(UsernameOrEmailBackend().authenticate(None, username='tester', password='password123'), user)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$2000$'))
+        self.assertTrue(user.check_password('password123'))
+
+    def test_signup_hashes_the_password(self):
+        payload = {'username': 'tester', 'email': 'tester@example.com', 'password': 'password123'}
+        response = APIClient().post(reverse('api:user_signup'), payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(User.objects.get(username='tester').check_password('password123'))
+
+    @override_settings(PASSWORD_HASHING={'MAX_CONCURRENT': 1, 'TIMEOUT': 0.01})
+    def test_busy_hashing_is_a_503(self):
+        User.objects.create_user(username='tester', email='tester@example.com', password='password123')
+        with hashers.hashing_slot():
+            response = APIClient().post(reverse('api-token-auth'), {'username': 'tester', 'password': 'password123'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.data['success'], False)
+        self.assertIn('Retry-After', response)
+        response = APIClient().post(reverse('api-token-auth'), {'username': 'tester', 'password': 'password123'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(PASSWORD_HASHING={'MAX_CONCURRENT': 1, 'TIMEOUT': 0.01})
+    def test_busy_hashing_outside_the_api_is_a_503(self):
+        # the admin login calls authenticate() itself, without DRF's exception handling
+        User.objects.create_user(username='tester', email='tester@example.com', password='password123', is_staff=True)
+        with hashers.hashing_slot():
+            response = self.client.post(reverse('admin:login'), {'username': 'tester', 'password': 'password123'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+    def test_unknown_hasher_setting(self):
+        with mock.patch.dict(os.environ, {'PASSWORD_HASHER': 'md5'}):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'pbkdf2, argon2, scrypt'):
+                runpy.run_path(settings_module.__file__)
+
+
+class UserSignUpTests(TestCase):
+    def signup(self, username='tester', email='tester@example.com'):
+        payload = {'username': username, 'email': email, 'password': 'password123'}
+        return APIClient().post(reverse('api:user_signup'), payload, format='json')
+
+    def test_creates_user_and_token_atomically(self):
+        # savepoint, user insert, token insert, release
+        with self.assertNumQueries(4):
+            response = self.signup()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['token'], Token.objects.get(user__username='tester').key)
+
+    def test_duplicates_keep_their_field_errors(self):
+        self.signup()
+        response = self.signup(email='other@example.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['message'], {'username': ['A user with that username already exists.']})
+        response = self.signup(username='other')
+        self.assertEqual(response.data['message'], {'email': ['user with this email already exists.']})
+        self.assertEqual(User.objects.count(), 1)
+        self.assertEqual(Token.objects.count(), 1)
+
+    def test_duplicates_ignore_case(self):
+        self.signup()
+        response = self.signup(username='Tester', email='other@example.com')
+        self.assertEqual(response.data['message'], {'username': ['A user with that username already exists.']})
+        response = self.signup(username='other', email='TESTER@example.com')
+        self.assertEqual(response.data['message'], {'email': ['user with this email already exists.']})
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_bench_command(self):
+        out = StringIO()
+        call_command('bench_signups', signups=3, runs=1, iterations=1000, stdout=out)
+        self.assertIn('signups/sec', out.getvalue())
+        self.assertFalse(User.objects.exists())